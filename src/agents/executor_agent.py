@@ -1,10 +1,11 @@
 import asyncio
+import os
 from typing import List
 
 from automation.browser_controller import BrowserController
 from automation.action_engine import ActionEngine
 from automation.screenshot_manager import ScreenshotManager
-from automation.dom_tree import get_page_accessibility_tree
+from automation.dom_tree import ACCESSIBILITY_TREE_JS, MAX_TREE_LENGTH, get_cdp_snapshot, truncate_tree
 from storage.dataset_writer import DatasetWriter
 from .message_protocol import (
     ActionStep,
@@ -15,6 +16,42 @@ from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+_FOCUSED_JS = """
+    const active = document.activeElement;
+    const focused = (!active || active === document.body) ? null : {
+        tag: active.tagName,
+        placeholder: active.placeholder || null,
+        value: active.value || null,
+        text: (active.innerText || '').slice(0, 50),
+    };
+"""
+
+# Title, URL and focused element only; the tree comes from CDP's
+# accessibility tree, fetched concurrently with this.
+_PAGE_INFO_JS = """() => {""" + _FOCUSED_JS + """
+    return { title: document.title, url: location.href, focused };
+}"""
+
+# Fallback when CDP is unavailable: page info and the JS tree walk gathered in
+# a single page.evaluate so the observation still costs one round-trip. The
+# active modal comes from the tree walk itself rather than a second scan.
+_OBSERVATION_JS = """() => {""" + _FOCUSED_JS + """
+    const snapshot = (""" + ACCESSIBILITY_TREE_JS + """)(""" + str(MAX_TREE_LENGTH) + """);
+
+    return {
+        title: document.title,
+        url: location.href,
+        focused,
+        modal: snapshot.modal,
+        tree: snapshot.tree,
+    };
+}"""
+
+
+def _write_text(path: str, text: str):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+
 
 class ExecutorAgent:
     def __init__(self, headless: bool = True):
@@ -36,19 +73,68 @@ class ExecutorAgent:
         logger.info("Browser started.")
 
     async def stop(self):
+        # End of run: write whatever steps are still buffered
+        await self.dataset_writer.flush()
         logger.info("Stopping browser...")
         await self.browser.stop()
+        # The page went back to the browser pool; don't hand it out again
+        self.page = None
         logger.info("Browser stopped.")
 
+    async def finish_run(self):
+        """Write out the run's buffered steps and drop its run dir so the next task gets a new one."""
+        await self.dataset_writer.flush()
+        self.task_dir = None
+
+    async def _build_observation(self) -> str:
+        obs, snapshot = await asyncio.gather(
+            self.page.evaluate(_PAGE_INFO_JS),
+            get_cdp_snapshot(self.page, MAX_TREE_LENGTH),
+            return_exceptions=True,
+        )
+        if isinstance(obs, Exception):
+            raise obs
+        if isinstance(snapshot, Exception):
+            logger.debug("CDP snapshot unavailable, walking the DOM instead: %s", snapshot)
+            obs = await self.page.evaluate(_OBSERVATION_JS)
+        else:
+            obs["modal"] = snapshot.modal
+            obs["tree"] = snapshot.tree
+
+        focused = obs["focused"]
+        if focused:
+            focused_info = (
+                f"Tag: {focused['tag']}, Placeholder: {focused['placeholder'] or 'None'}, "
+                f"Value: {focused['value'] or 'None'}, Text: {focused['text']}"
+            )
+        else:
+            focused_info = "None"
+
+        modal_info = "None"
+        if obs["modal"] is not None:
+            modal_info = f"Visible (Text: {obs['modal']['text']}...)"
+
+        dom_tree = truncate_tree(obs["tree"])
+
+        return (
+            f"Current Page: {obs['title']} ({obs['url']})\n"
+            f"Active Modal: {modal_info}\n"
+            f"Focused Element: {focused_info}\n"
+            f"Interactive Elements:\n{dom_tree}"
+        )
+
     async def execute(self, task: str, steps: List[ActionStep], keep_open: bool = False, existing_page=None, start_step_index: int = 0):
         if existing_page:
             self.page = existing_page
-            self.action_engine = ActionEngine(self.page)
-            
+            if self.action_engine is None:
+                self.action_engine = ActionEngine(self.page)
+            elif self.action_engine.page is not self.page:
+                self.action_engine.set_page(self.page)
+
             if not self.task_dir:
                  self.task_dir = self.dataset_writer.create_run_dir(task)
-            
-            if not self.screenshot_mgr:
+
+            if self.screenshot_mgr is None or self.screenshot_mgr.base_dataset_dir != self.task_dir:
                  self.screenshot_mgr = ScreenshotManager(self.task_dir)
         else:
             await self.start(task)
@@ -58,9 +144,8 @@ class ExecutorAgent:
 
         for step in steps:
             step_index += 1
-            logger.info(f"Executing step {step_index}: {step.dict()}")
-
-            step_payload = step.dict()
+            step_payload = step.model_dump()
+            logger.info("Executing step %s: %s", step_index, step_payload)
 
             success, error_msg = await self.action_engine.run_step(step_payload)
 
@@ -76,7 +161,7 @@ class ExecutorAgent:
                         filename=screenshot_filename
                     )
                 except Exception as e:
-                    logger.warning(f"Screenshot failed for step {step_index}: {e}")
+                    logger.warning("Screenshot failed for step %s: %s", step_index, e)
                     shot_meta = None
 
             step_record = StepExecutionResult(
@@ -90,75 +175,57 @@ class ExecutorAgent:
                 details={"error": error_msg} if error_msg else {},
             )
 
-            logger.info(f"Step {step_index} result: {step_record.dict()}")
+            logger.info("Step %s result: %s", step_index, step_record)
 
-            self.dataset_writer.write_step(task, step_record, self.task_dir)
+            await self.dataset_writer.buffer_step(task, step_record, self.task_dir)
             result.steps.append(step_record)
 
             if not success:
-                logger.error(f"Step {step_index} failed. Error: {error_msg}")
+                logger.error("Step %s failed. Error: %s", step_index, error_msg)
                 result.mark_failure(f"Step {step_index} failed.")
                 
                 try:
-                    title = await self.page.title()
-                    url = self.page.url
-                    dom_tree = await get_page_accessibility_tree(self.page)
-                    
-                    observation = f"Current Page: {title} ({url})\nInteractive Elements:\n{dom_tree}"
-                    
-                    with open("d:/Softlight_Assesment/Softlight_Assesment/latest_observation.txt", "w", encoding="utf-8") as f:
-                        f.write(observation)
-                        
+                    observation = await self._build_observation()
+
+                    await asyncio.to_thread(
+                        _write_text,
+                        os.path.join(self.task_dir, "latest_observation.txt"),
+                        observation,
+                    )
+
                     result.dataset_path = observation 
                 except Exception as e:
-                    logger.error(f"Failed to capture observation: {e}")
+                    logger.error("Failed to capture observation: %s", e)
 
                 if not keep_open and not existing_page:
                     await self.stop()
                 return result
 
-            logger.info(f"Step {step_index} completed successfully.")
+            logger.info("Step %s completed successfully.", step_index)
             
-            await asyncio.sleep(1.0)
-
-            if success and step.action in ("navigate", "click", "type", "screenshot"):
-                 try:
-                    shot_meta = await self.screenshot_mgr.capture(
+            if step.action in ("navigate", "click", "type", "screenshot"):
+                # Capture during the stabilization window instead of after it
+                _, shot_meta = await asyncio.gather(
+                    asyncio.sleep(1.0),
+                    self.screenshot_mgr.capture(
                         self.page,
                         step.name or f"step_{step_index}",
                         full_page=True,
                         filename=screenshot_filename
-                    )
+                    ),
+                    return_exceptions=True,
+                )
+                if isinstance(shot_meta, Exception):
+                    logger.warning("Stabilization screenshot failed for step %s: %s", step_index, shot_meta)
+                else:
                     step_record.screenshot_path = shot_meta["path"]
                     step_record.page_url = shot_meta["page_url"]
-                    self.dataset_writer.write_step(task, step_record, self.task_dir)
-                 except Exception as e:
-                    logger.warning(f"Post-stabilization screenshot failed for step {step_index}: {e}")
-        
+            else:
+                await asyncio.sleep(1.0)
+
         try:
-            title = await self.page.title()
-            url = self.page.url
-            
-            focused_info = await self.page.evaluate("""() => {
-                const active = document.activeElement;
-                if (!active || active === document.body) return "None";
-                return `Tag: ${active.tagName}, Placeholder: ${active.placeholder || 'None'}, Value: ${active.value || 'None'}, Text: ${active.innerText.slice(0, 50)}`;
-            }""")
-
-            from automation.ui_state_detector import find_active_modal
-            modal_locator = await find_active_modal(self.page)
-            modal_info = "None"
-            if modal_locator:
-                try:
-                    modal_text = await modal_locator.inner_text()
-                    modal_info = f"Visible (Text: {modal_text[:100]}...)"
-                except Exception:
-                    modal_info = "Visible (Text unavailable)"
+            observation = await self._build_observation()
 
-            dom_tree = await get_page_accessibility_tree(self.page)
-            
-            observation = f"Current Page: {title} ({url})\nActive Modal: {modal_info}\nFocused Element: {focused_info}\nInteractive Elements:\n{dom_tree}"
-            
             if not success:
                 observation = f"!!! LAST ACTION FAILED: {error_msg} !!!\n\n{observation}"
                 
@@ -1,5 +1,6 @@
+from dataclasses import dataclass, field
 from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class ActionStep(BaseModel):
@@ -17,8 +18,7 @@ class ActionStep(BaseModel):
     api_method: Optional[str] = None       
     payload: Optional[Dict[str, Any]] = None   
 
-    class Config:
-        extra = "allow"
+    model_config = ConfigDict(extra="allow")
 
 
 class Plan(BaseModel):
@@ -27,7 +27,10 @@ class Plan(BaseModel):
     model_used: Optional[str] = None
     planning_success: bool = True
 
-class StepExecutionResult(BaseModel):
+# Created once per executed step, so kept as a plain slotted dataclass rather
+# than a validating model; pydantic still accepts it inside ExecutionResult.
+@dataclass(slots=True)
+class StepExecutionResult:
     step_index: int
     action: str
     success: bool
@@ -35,7 +38,7 @@ class StepExecutionResult(BaseModel):
     screenshot_path: Optional[str] = None
     page_url: Optional[str] = None
     error: Optional[str] = None
-    details: Dict[str, Any] = Field(default_factory=dict)
+    details: Dict[str, Any] = field(default_factory=dict)
 
 
 class ExecutionResult(BaseModel):
@@ -62,5 +65,21 @@ class AgentState(BaseModel):
     observation: Optional[str] = None  
     is_complete: bool = False          
 
-    class Config:
-        arbitrary_types_allowed = True
\ No newline at end of file
+    # LangGraph rebuilds the state from channel values every step; nested
+    # Plan/ExecutionResult instances (and the shared steps list) must pass
+    # through as-is rather than be re-validated. "never" is pydantic's
+    # default, pinned here because the executor relies on it.
+    model_config = ConfigDict(arbitrary_types_allowed=True, revalidate_instances="never")
+
+    def should_continue(self) -> bool:
+        """Whether the run goes back to the planner after an execution step."""
+        # If final flag is set, we are done
+        if self.final:
+            return False
+
+        # We check retry_count to prevent infinite loops on errors.
+        if self.execution and self.execution.error and self.retry_count >= 3:
+            return False
+
+        # Otherwise, go back to planner for next steps
+        return True
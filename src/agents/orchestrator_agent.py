@@ -5,6 +5,13 @@ from utils.logger import get_logger
 
 logger = get_logger(__name__)
 
+# One scan decides the rewrite: group "value" for input[value=...] at the start,
+# group "text" for XPath-style [text()='...'] / [text='...'] anywhere.
+_SELECTOR_FIXUP_RE = re.compile(
+    r"^input\[value=(?P<value>.*)\]"
+    r"|\[text(?:\(\))?\s*=\s*['\"](?P<text>[^'\"]+)['\"]\]"
+)
+
 
 def normalize_selector(sel):
     if not sel:
@@ -25,7 +32,9 @@ def normalize_selector(sel):
     return None
 
 
-def clean_selector(selector: str | None):
+def process_selector(sel):
+    """Normalize an LLM selector (dict or string) and fix known syntax issues in one pass."""
+    selector = normalize_selector(sel)
     if not selector:
         return selector
 
@@ -34,24 +43,18 @@ def clean_selector(selector: str | None):
         cleaned_val = val.strip().strip('"').strip("'")
         return f'text="{cleaned_val}"'
 
-    match = re.match(r"input\[value=(.*)\]", selector)
-    if match:
-        value = match.group(1).strip().strip('"').strip("'")
-        return f"input[value='{value}']"
+    match = _SELECTOR_FIXUP_RE.search(selector)
+    if not match:
+        return selector
 
-    xpath_patterns = [
-        (r"\[text\(\)\s*=\s*['\"]([^'\"]+)['\"]\]", r':has-text("\1")'),
-        (r"\[text\s*=\s*['\"]([^'\"]+)['\"]\]", r':has-text("\1")'),
-    ]
-    
-    for pattern, replacement in xpath_patterns:
-        if re.search(pattern, selector):
-            new_selector = re.sub(pattern, replacement, selector)
-            logger.warning(f"Detected invalid XPath syntax in selector: {selector}")
-            logger.warning(f"Converted to valid CSS: {new_selector}")
-            return new_selector
+    if match.group("value") is not None:
+        value = match.group("value").strip().strip('"').strip("'")
+        return f"input[value='{value}']"
 
-    return selector
+    new_selector = _SELECTOR_FIXUP_RE.sub(lambda m: f':has-text("{m.group("text")}")', selector)
+    logger.warning(f"Detected invalid XPath syntax in selector: {selector}")
+    logger.warning(f"Converted to valid CSS: {new_selector}")
+    return new_selector
 
 
 
@@ -59,7 +62,7 @@ class OrchestratorAgent:
     def __init__(self):
         self.llm = LLMClient()
 
-    def create_plan(self, task: str, observation: str = None, history: list = None) -> Plan:
+    async def create_plan(self, task: str, observation: str = None, history: list = None) -> Plan:
         logger.info(f"Creating plan for task: {task}")
         if observation:
             logger.info(f"With observation: {observation[:100]}...")
@@ -78,7 +81,7 @@ class OrchestratorAgent:
                             planning_success=True,
                         )
 
-        raw_steps = self.llm.plan(task, observation, history)
+        raw_steps = await self.llm.plan(task, observation, history)
         logger.info(f"Raw LLM response: {raw_steps}")
 
         processed_steps = []
@@ -86,8 +89,7 @@ class OrchestratorAgent:
             s = dict(step)
 
             if "selector" in s and s["selector"]:
-                s["selector"] = normalize_selector(s["selector"])
-                s["selector"] = clean_selector(s["selector"])
+                s["selector"] = process_selector(s["selector"])
 
             processed_steps.append(s)
 
@@ -1,16 +1,110 @@
 import logging
 import asyncio
+import re
 from automation.ui_state_detector import find_active_modal
 
 logger = logging.getLogger(__name__)
 
+_STRIP_QUOTES = re.compile(r"""^[\s'"]+|[\s'"]+$""")
+
+# How long higher-priority _race candidates may still take to appear once a
+# lower-priority one is already visible
+_RACE_GRACE_MS = 500
+
+# Resolves a text= click target entirely in the page (role names first, then
+# exact text, then the tightest element containing the text) and marks it with
+# data-llm-click-target so Python only needs a single click round-trip.
+_RESOLVE_CLICK_TARGET_JS = """
+([variations, roles]) => {
+    const IMPLICIT_ROLES = {
+        button: 'button, input[type="button"], input[type="submit"], input[type="reset"]',
+        link: 'a[href]',
+        checkbox: 'input[type="checkbox"]',
+        radio: 'input[type="radio"]',
+    };
+    const norm = (s) => (s || '').replace(/\\s+/g, ' ').trim();
+    // checkVisibility drops visibility:hidden / opacity:0 nodes (e.g. closed
+    // menus), which a .click() would only time out on
+    const visible = (el) => el.checkVisibility
+        ? el.checkVisibility({ checkOpacity: true, checkVisibilityCSS: true })
+        : el.getClientRects().length > 0;
+    // Candidate lists and labels are built on first use: a role hit never
+    // pays for the generic scan, and each element's innerText is read once
+    const lazy = (selector) => {
+        let els = null;
+        return () => els || (els = [...document.querySelectorAll(selector)].filter(visible));
+    };
+    const memo = (label) => {
+        const cache = new Map();
+        return (el) => {
+            let value = cache.get(el);
+            if (value === undefined) cache.set(el, value = label(el));
+            return value;
+        };
+    };
+    const mark = (el) => { el.setAttribute('data-llm-click-target', ''); return true; };
+
+    document.querySelectorAll('[data-llm-click-target]')
+        .forEach((el) => el.removeAttribute('data-llm-click-target'));
+
+    const byRole = {};
+    for (const role of roles) {
+        byRole[role] = lazy(`[role="${role}"]` + (IMPLICIT_ROLES[role] ? ', ' + IMPLICIT_ROLES[role] : ''));
+    }
+    const roleLabel = memo((el) => norm(el.getAttribute('aria-label') || el.innerText || el.value));
+    const generic = lazy('button, a, div, span');
+    const textLabel = memo((el) => norm(el.innerText));
+
+    for (const name of variations) {
+        const lower = name.toLowerCase();
+        for (const role of roles) {
+            const els = byRole[role]();
+            const hit = els.find((el) => roleLabel(el) === name)
+                || els.find((el) => roleLabel(el).toLowerCase().includes(lower));
+            if (hit) return mark(hit);
+        }
+
+        const els = generic();
+        const exact = els.find((el) => textLabel(el) === name);
+        if (exact) return mark(exact);
+
+        let best = null;
+        let bestLength = Infinity;
+        for (const el of els) {
+            const label = textLabel(el);
+            if (label.length < bestLength && label.includes(name)) {
+                best = el;
+                bestLength = label.length;
+            }
+        }
+        if (best) return mark(best);
+    }
+    return false;
+}
+"""
+
 class ActionEngine:
     def __init__(self, page):
         self.page = page
         self.scope = page
         self.active_modal = None
 
-
+        self._handlers = {
+            "navigate": lambda s: self._do_navigate(s),
+            "click": lambda s: self._do_click(s.get("selector")),
+            "right_click": lambda s: self._do_right_click(s.get("selector")),
+            "type": lambda s: self._do_type(s.get("selector"), s.get("value")),
+            "press": lambda s: self._do_press(s.get("selector"), s.get("value")),
+            "wait_for": lambda s: self._do_wait_for(s.get("selector")),
+            "wait_for_user": lambda s: self._do_wait_for_user(s.get("value")),
+            "screenshot": lambda s: self._do_screenshot(),
+        }
+
+    def set_page(self, page):
+        """Point the engine at a different page, keeping the handler table."""
+        self.page = page
+        self.scope = page
+        self.active_modal = None
 
     async def run_step(self, step: dict):
         action = step.get("action")
@@ -18,47 +112,30 @@ class ActionEngine:
         value = step.get("value")
 
         logger.info(
-            f"Running action: {action} with selector: {selector} and value: {value}"
+            "Running action: %s with selector: %s and value: %s", action, selector, value
         )
 
         try:
-            if action == "navigate":
-                return await self._do_navigate(step)
-
-            if action == "click":
-                return await self._do_click(selector)
-
-            if action == "right_click":
-                return await self._do_right_click(selector)
-
-            if action == "type":
-                return await self._do_type(selector, value)
-
-            if action == "press":
-                return await self._do_press(selector, value)
-
-            if action == "wait_for":
-                return await self._do_wait_for(selector)
-
-            if action == "wait_for_user":
-                return await self._do_wait_for_user(value)
-
-            if action == "screenshot":
-                return True, None
-
-            return False, f"Unknown action: {action}"
+            handler = self._handlers.get(action)
+            if handler is None:
+                return False, f"Unknown action: {action}"
+            return await handler(step)
 
         except Exception as e:
-            logger.error(f"Error during action '{action}': {e}")
+            logger.error("Error during action '%s': %s", action, e)
             return False, str(e)
 
 
+    async def _do_screenshot(self):
+        # Capture itself is done by the executor after the step
+        return True, None
+
     async def _do_navigate(self, step: dict):
         url = step.get("value")
         if not url:
             return False, "Missing URL for navigate"
 
-        logger.info(f"Navigating to {url}")
+        logger.info("Navigating to %s", url)
         try:
             await self.page.goto(url, wait_until="load")
             self.active_modal = None
@@ -71,7 +148,7 @@ class ActionEngine:
         if not selector:
             return None
         if selector.startswith("text="):
-            return selector.split("=", 1)[1].strip().strip('"').strip("'")
+            return _STRIP_QUOTES.sub("", selector.split("=", 1)[1])
         return None
 
 
@@ -81,81 +158,41 @@ class ActionEngine:
 
 
         if "[text=" in selector:
-            import re
             selector = re.sub(r"\[text=(['\"])(.*?)\1\]", r":has-text(\1\2\1)", selector)
-            logger.info(f"Sanitized selector to: {selector}")
+            logger.info("Sanitized selector to: %s", selector)
 
-        logger.info(f"Clicking: {selector}")
+        logger.info("Clicking: %s", selector)
 
         text = await self._extract_text(selector)
         if text:
-            variations = {
+            # Ordered and de-duplicated; the ellipsis swaps only apply when present
+            variations = list(dict.fromkeys(filter(None, [
                 text,
-                text.replace("...", "…"),
-                text.replace("…", "..."),
                 text.strip(),
                 text.lower(),
                 text.title(),
-            }
+                text.replace("...", "…") if "..." in text else None,
+                text.replace("…", "...") if "…" in text else None,
+            ])))
 
             roles = ["button", "link", "menuitem", "tab", "checkbox", "radio"]
 
-            for name in variations:
-                for role in roles:
-                    try:
-                        await self.page.get_by_role(role, name=name).first.click(
-                            timeout=2000
-                        )
-                        self.active_modal = await find_active_modal(self.page)
-                        logger.info(f"Clicked via role={role}, name='{name}'")
-                        return True, None
-                    except Exception:
-                        pass
-
-                try:
-                    await self.page.get_by_text(name, exact=True).first.click(
+            try:
+                found = await self.page.evaluate(
+                    _RESOLVE_CLICK_TARGET_JS, [variations, roles]
+                )
+                if found:
+                    await self.page.locator("[data-llm-click-target]").first.click(
                         timeout=2000
                     )
                     self.active_modal = await find_active_modal(self.page)
-                    logger.info(f"Clicked via exact text '{name}'")
-                    return True, None
-                except Exception:
-                    pass
-
-                try:
-                    await self.page.get_by_text(name).first.click(timeout=2000)
-                    self.active_modal = await find_active_modal(self.page)
-                    logger.info(f"Clicked via fuzzy text '{name}'")
-                    return True, None
-                except Exception:
-                    pass
-
-                try:
-                    await self.page.locator("button, a, div, span").filter(
-                        has_text=name
-                    ).first.click(timeout=2000)
-                    self.active_modal = await find_active_modal(self.page)
-                    logger.info(f"Clicked via generic element has_text '{name}'")
+                    logger.info("Clicked via in-page text match '%s'", text)
                     return True, None
-                except Exception:
-                    pass
-
-        contexts = []
+            except Exception:
+                pass
 
-        if self.active_modal:
-            contexts.append(self.active_modal)
-
-        contexts.extend(
-            [
-                self.page,
-                self.page.locator("body"),
-                self.page.locator("div[role='menu']"),
-                self.page.locator("div[data-radix-context-menu-content]"),
-                self.page.locator("div[class*='ContextMenuContent']"),
-                self.page.locator("div[data-portal-root]"),
-                self.page.locator("div[data-overlay-container']"),
-            ]
-        )
+        # page.locator already searches the whole document, portals included
+        contexts = [self.active_modal, self.page] if self.active_modal else [self.page]
 
         for attempt in range(1, 4):
             try:
@@ -164,7 +201,7 @@ class ActionEngine:
                         await ctx.locator(selector).first.click(timeout=2000)
                         self.active_modal = await find_active_modal(self.page)
                         logger.info(
-                            f"Clicked via raw selector '{selector}' on attempt {attempt}"
+                            "Clicked via raw selector '%s' on attempt %s", selector, attempt
                         )
                         return True, None
                     except Exception:
@@ -181,8 +218,7 @@ class ActionEngine:
                             )
                             self.active_modal = await find_active_modal(self.page)
                             logger.info(
-                                f"Force-clicked via raw selector '{selector}' "
-                                f"on final attempt"
+                                "Force-clicked via raw selector '%s' on final attempt", selector
                             )
                             return True, None
                         except Exception:
@@ -196,26 +232,25 @@ class ActionEngine:
         if not selector:
             return False, "Missing selector"
 
-        logger.info(f"Right-clicking: {selector}")
+        logger.info("Right-clicking: %s", selector)
 
         contexts = [self.page, self.page.locator("body")]
         if self.active_modal:
             contexts.insert(0, self.active_modal)
 
-        for ctx in contexts:
-            try:
-                await ctx.locator(selector).first.click(button="right", timeout=4000)
-                await asyncio.sleep(0.3)
-                self.active_modal = await find_active_modal(self.page)
-                logger.info(f"Right-clicked on selector '{selector}'")
-                return True, None
-            except Exception:
-                continue
+        async def right_click(loc):
+            await loc.click(button="right", timeout=4000)
+
+        if await self._race([(ctx.locator(selector).first, 4000, right_click) for ctx in contexts]):
+            await asyncio.sleep(0.3)
+            self.active_modal = await find_active_modal(self.page)
+            logger.info("Right-clicked on selector '%s'", selector)
+            return True, None
 
         return False, f"Could not right-click {selector}"
 
     async def _do_type(self, selector: str | None, value: str | None):
-        logger.info(f"Typing: {value} into {selector}")
+        logger.info("Typing: %s into %s", value, selector)
 
         if value is None:
             return False, "Missing value for type"
@@ -225,25 +260,29 @@ class ActionEngine:
             contexts.insert(0, self.active_modal)
 
         if selector == "focused":
-            logger.info(f"Typing into FOCUSED element: {value}")
+            logger.info("Typing into FOCUSED element: %s", value)
             try:
                 await self.page.keyboard.type(value)
                 return True, None
             except Exception as e:
                 return False, f"Failed to type into focused element: {e}"
 
+        is_label = bool(selector) and selector.startswith("label=")
+        is_complex = bool(selector) and (
+            "div" in selector or "role='textbox'" in selector or "contenteditable" in selector
+        )
+        label = _STRIP_QUOTES.sub("", selector.split("=", 1)[1]) if is_label else None
+
         for ctx in contexts:
             try:
-                if selector and selector.startswith("label="):
-                    label = selector.split("=", 1)[1].strip().strip('"').strip("'")
-                    logger.info(f"Trying get_by_label('{label}')")
+                if is_label:
+                    logger.info("Trying get_by_label('%s')", label)
                     await ctx.get_by_label(label).fill(value, timeout=6000)
                     return True, None
 
                 if selector:
-                    logger.info(f"Trying direct locator('{selector}')")
-                    is_complex = "div" in selector or "role='textbox'" in selector or "contenteditable" in selector
-                    
+                    logger.info("Trying direct locator('%s')", selector)
+
                     if is_complex:
                         try:
                             await ctx.locator(selector).fill(value, timeout=3000)
@@ -259,45 +298,94 @@ class ActionEngine:
 
         primary_ctx = contexts[0]
 
-        try:
-            logger.info("Fallback: trying fuzzy placeholders (Name, Project, Title)")
-            for fuzzy in ["Name", "Project", "Title", "Subject"]:
-                try:
-                    await primary_ctx.locator(f"input[placeholder*='{fuzzy}' i]").first.fill(
-                        value, timeout=2000
-                    )
-                    return True, None
-                except Exception:
-                    continue
-        except Exception:
-            pass
-            
-        try:
-            logger.info("Fallback: trying div[role='textbox']")
-            if selector and "aria-label=" in selector:
-                 label_text = selector.split("aria-label=", 1)[1].strip().strip('"').strip("'").split("]")[0].strip("'").strip('"')
-                 await primary_ctx.locator(f"div[role='textbox'][aria-label='{label_text}']").first.click()
-                 await self.page.keyboard.type(value)
-                 return True, None
-        except Exception:
-            pass
+        async def fill(loc):
+            await loc.fill(value, timeout=6000)
 
-        try:
-            logger.info("Fallback: trying first input[value]")
-            await primary_ctx.locator("input[value]").first.fill(value, timeout=6000)
-            return True, None
-        except Exception:
-            pass
+        async def click_and_type(loc):
+            await loc.click(timeout=6000)
+            await self.page.keyboard.type(value)
 
-        try:
-            logger.info("Fallback: trying first visible input or textarea")
-            await primary_ctx.locator("input, textarea").first.fill(value, timeout=6000)
+        # Same fallbacks as before, in priority order, but resolved concurrently;
+        # the generic input/textarea only wins if nothing better shows up
+        candidates = [
+            (primary_ctx.locator(f"input[placeholder*='{fuzzy}' i]").first, 2000, fill)
+            for fuzzy in ["Name", "Project", "Title", "Subject"]
+        ]
+        if selector and "aria-label=" in selector:
+            label_text = _STRIP_QUOTES.sub("", _STRIP_QUOTES.sub("", selector.split("aria-label=", 1)[1]).split("]")[0])
+            candidates.append(
+                (primary_ctx.locator(f"div[role='textbox'][aria-label='{label_text}']").first, 6000, click_and_type)
+            )
+        candidates.append((primary_ctx.locator("input[value]").first, 6000, fill))
+        candidates.append((primary_ctx.locator("input, textarea").first, 6000, fill))
+
+        logger.info("Fallback: racing fuzzy placeholders, div[role='textbox'], input[value], input/textarea")
+        if await self._race(candidates):
             return True, None
-        except Exception:
-            pass
 
         return False, f"Could not type into {selector}"
 
+    async def _race(self, candidates) -> bool:
+        """
+        candidates: (locator, timeout_ms, action) tuples in priority order.
+        All locators are probed concurrently and action(locator) runs on the
+        highest-priority one found, falling through to the rest if it fails.
+        A lower-priority match only wins after the higher-priority ones have
+        had _RACE_GRACE_MS more to appear, for fields that render late.
+        Worst case is bounded by the longest single timeout (plus the grace)
+        instead of their sum.
+        """
+        remaining = list(candidates)
+
+        while remaining:
+            # Elements already on the page: pick by priority in one round of checks
+            visible = await asyncio.gather(
+                *(loc.is_visible() for loc, _, _ in remaining), return_exceptions=True
+            )
+            winner = next((i for i, v in enumerate(visible) if v is True), None)
+
+            if winner is None:
+                winner = await self._first_to_appear(remaining)
+                if winner is None:
+                    return False
+
+            if winner > 0:
+                better = await self._first_to_appear(remaining[:winner], _RACE_GRACE_MS)
+                if better is not None:
+                    winner = better
+
+            loc, _, action = remaining.pop(winner)
+            try:
+                await action(loc)
+                return True
+            except Exception:
+                continue
+
+        return False
+
+    async def _first_to_appear(self, candidates, max_timeout: int | None = None):
+        tasks = [
+            asyncio.create_task(loc.wait_for(
+                state="visible",
+                timeout=timeout if max_timeout is None else min(timeout, max_timeout),
+            ))
+            for loc, timeout, _ in candidates
+        ]
+        try:
+            pending = set(tasks)
+            while pending:
+                _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for i, task in enumerate(tasks):
+                    if task.done() and task.exception() is None:
+                        return i
+            return None
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled():
+                    task.exception()
+
     async def _click_and_type(self, ctx, selector, value):
         try:
             await ctx.locator(selector).first.click()
@@ -312,7 +400,7 @@ class ActionEngine:
         if not value:
             return False, "Missing key to press (value)"
 
-        logger.info(f"Pressing key: {value} on {selector or 'page'}")
+        logger.info("Pressing key: %s on %s", value, selector or 'page')
 
         try:
             if selector:
@@ -328,7 +416,7 @@ class ActionEngine:
         print(f"\n[ACTION REQUIRED] {msg}")
         print("Press Enter in this terminal once you are done to continue...")
         
-        await asyncio.get_event_loop().run_in_executor(None, input)
+        await asyncio.to_thread(input)
         
         logger.info("User confirmed manual action completion.")
         return True, None
@@ -341,8 +429,11 @@ class ActionEngine:
             if selector == "url" or selector.startswith("url="):
                 target_url = selector.split("=", 1)[1] if "=" in selector else None
                 if target_url:
-                    await self.page.wait_for_url(lambda url: target_url in url, timeout=15000)
-                    logger.info(f"Waited for URL to contain '{target_url}'")
+                    # Polled inside the page rather than via a Python predicate
+                    await self.page.wait_for_function(
+                        "u => location.href.includes(u)", arg=target_url, timeout=15000
+                    )
+                    logger.info("Waited for URL to contain '%s'", target_url)
                 else:
                     await self.page.wait_for_load_state("load", timeout=15000)
                     logger.info("Waited for page load")
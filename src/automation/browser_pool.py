@@ -0,0 +1,194 @@
+# src/automation/browser_pool.py
+import asyncio
+import os
+from typing import Dict, Optional, Tuple
+
+from playwright.async_api import async_playwright, Playwright, BrowserContext, Page
+from utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+PoolEntry = Tuple[Playwright, BrowserContext, Page]
+
+_MUTATION_OBSERVER_SCRIPT = """
+    if (!window.__mutationCount) {
+        window.__mutationCount = 0;
+        window.__modalDirty = true;
+        new MutationObserver((records) => {
+            if (records.some((r) => r.type === 'childList')) window.__mutationCount++;
+            window.__modalDirty = true;
+        }).observe(document, {
+            childList: true,
+            subtree: true,
+            attributes: true,
+            attributeFilter: ['class', 'style', 'role', 'open', 'hidden', 'aria-modal', 'aria-hidden'],
+        });
+    }
+"""
+
+# Active-modal lookup that only re-queries the DOM after the observer above has
+# seen a change; otherwise it is a property read. The modal found is stamped
+# with data-llm-active-modal so Python can address it with a plain locator.
+_ACTIVE_MODAL_SCRIPT = """
+    window.__activeModal = false;
+    window.__llmActiveModal = () => {
+        if (!window.__modalDirty) return window.__activeModal;
+        window.__modalDirty = false;
+
+        const selectors = [
+            '[role="dialog"]',
+            '[class*="modal"]',
+            '[class*="dialog"]',
+            '[aria-modal="true"]',
+            'div[style*="z-index"][style*="fixed"]'
+        ];
+        let found = null;
+        for (const sel of selectors) {
+            const el = document.querySelector(sel);
+            if (el && el.getClientRects().length > 0 && getComputedStyle(el).visibility !== 'hidden') {
+                found = el;
+                break;
+            }
+        }
+
+        const prev = document.querySelector('[data-llm-active-modal]');
+        if (prev && prev !== found) prev.removeAttribute('data-llm-active-modal');
+        if (found) found.setAttribute('data-llm-active-modal', '');
+
+        window.__activeModal = !!found;
+        return window.__activeModal;
+    };
+"""
+
+# Registered once per document so callers can reference it instead of
+# shipping (and re-parsing) the same function source on every evaluate.
+_ACCESSIBLE_NAME_SCRIPT = """
+    window.__llmAccName = (el) => {
+        try {
+            return window.getComputedAccessibleNode(el).name;
+        } catch (e) {
+            return el.innerText || el.getAttribute('aria-label') || '';
+        }
+    };
+"""
+
+
+class BrowserPool:
+    """
+    Keeps warm (playwright, context, page) entries so a task can check out an
+    already-launched browser instead of paying Chromium cold-start each run.
+    Works like a DB connection pool: acquire() hands out an idle entry (or
+    launches one), release() resets the page and puts it back.
+    """
+
+    _playwright: Optional[Playwright] = None
+    _queues: Dict[bool, asyncio.Queue] = {}
+    _contexts: list = []
+    _launched = 0
+    _lock = asyncio.Lock()
+
+    @classmethod
+    def _queue(cls, headless: bool) -> asyncio.Queue:
+        if headless not in cls._queues:
+            cls._queues[headless] = asyncio.Queue()
+        return cls._queues[headless]
+
+    @classmethod
+    async def _launch(cls, headless: bool) -> PoolEntry:
+        if cls._playwright is None:
+            cls._playwright = await async_playwright().start()
+
+        # Chromium locks a profile directory per process, so every pooled
+        # context after the first gets its own profile.
+        profile = "browser_profile" if cls._launched == 0 else f"browser_profile_{cls._launched}"
+        cls._launched += 1
+
+        user_data_dir = os.path.abspath(profile)
+        if not os.path.exists(user_data_dir):
+            os.makedirs(user_data_dir)
+
+        context = await cls._playwright.chromium.launch_persistent_context(
+            user_data_dir,
+            headless=headless,
+            channel="chrome",
+            args=[
+                "--disable-blink-features=AutomationControlled",
+            ],
+            viewport={"width": 1280, "height": 720}
+        )
+        cls._contexts.append(context)
+
+        page = context.pages[0] if context.pages else await context.new_page()
+        await page.add_init_script(_MUTATION_OBSERVER_SCRIPT)
+        await page.add_init_script(_ACTIVE_MODAL_SCRIPT)
+        await page.add_init_script(_ACCESSIBLE_NAME_SCRIPT)
+
+        return cls._playwright, context, page
+
+    @classmethod
+    async def warmup(cls, n: int = 1, headless: bool = True):
+        """Pre-launch n browsers; meant to be called once at service start."""
+        async with cls._lock:
+            queue = cls._queue(headless)
+            for _ in range(n):
+                try:
+                    queue.put_nowait(await cls._launch(headless))
+                except Exception as e:
+                    logger.warning(f"Browser warm-up failed: {e}")
+                    return
+
+    @classmethod
+    async def acquire(cls, headless: bool = True) -> PoolEntry:
+        # Taking the lock also waits for an in-flight warmup to finish.
+        async with cls._lock:
+            queue = cls._queue(headless)
+            if not queue.empty():
+                return queue.get_nowait()
+            return await cls._launch(headless)
+
+    @classmethod
+    async def release(cls, controller):
+        if controller.context is None:
+            return
+
+        entry = (controller.playwright, controller.context, controller.page)
+        try:
+            await controller.page.goto("about:blank")
+        except Exception:
+            # Page is unusable; drop it rather than hand it to the next task.
+            try:
+                await controller.context.close()
+            except Exception:
+                pass
+            cls._contexts.remove(controller.context)
+            return
+
+        cls._queue(controller.headless).put_nowait(entry)
+
+    @classmethod
+    async def close_all(cls):
+        """
+        Close the idle pooled browsers. Contexts still checked out by a running
+        task are left alone; the driver stops once none remain.
+        """
+        async with cls._lock:
+            for queue in cls._queues.values():
+                while not queue.empty():
+                    _, context, _ = queue.get_nowait()
+                    cls._contexts.remove(context)
+                    try:
+                        await context.close()
+                    except Exception:
+                        pass
+
+            if cls._contexts:
+                return
+
+            # Every profile is unlocked again; the next launch reuses the
+            # primary one and its saved login sessions
+            cls._launched = 0
+            cls._queues.clear()
+
+            if cls._playwright:
+                await cls._playwright.stop()
+                cls._playwright = None
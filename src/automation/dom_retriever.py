@@ -1,60 +1,42 @@
 # src/automation/dom_retriever.py
-import asyncio
 from typing import List, Dict, Any
-from playwright.async_api import Page, Locator
+from playwright.async_api import Page
+
+INTERACTIVE_SELECTORS = [
+    "a", "button", "input:not([type='hidden'])",
+    "textarea", "select", "[role='button']", "[role='link']",
+    "[role='menuitem']", "[role='tab']", "[role='option']"
+]
+
+# Runs entirely in the page: one round-trip for the whole element list instead
+# of several Playwright calls per element.
+_COLLECT_JS = """
+(selector) => {
+    // checkVisibility (Chromium 105+) does the style/layout test natively
+    const isVisible = (el) => el.checkVisibility
+        ? el.checkVisibility({ checkOpacity: true, checkVisibilityCSS: true })
+        : el.getClientRects().length > 0;
+    const els = [...document.querySelectorAll(selector)].filter(isVisible);
+    return els.map((el, i) => {
+        const id = 'llm-element-' + i;
+        el.setAttribute('data-llm-id', id);
+        const accessibleName = window.__llmAccName
+            ? window.__llmAccName(el)
+            : (el.getAttribute('aria-label') || el.innerText || '');
+        return {
+            llm_id: id,
+            text: (accessibleName || el.textContent || '').trim(),
+            tag: el.tagName.toLowerCase(),
+        };
+    });
+}
+"""
+
 
 async def get_interactive_elements(page: Page) -> List[Dict[str, Any]]:
     """
     Retrieves all interactive elements from the page and assigns them a unique ID.
     Interactive elements are buttons, links, inputs, and elements with specific roles.
     """
-    interactive_elements = []
-    selectors = [
-        "a", "button", "input:not([type='hidden'])",
-        "textarea", "select", "[role='button']", "[role='link']",
-        "[role='menuitem']", "[role='tab']", "[role='option']"
-    ]
-
-    combined_selector = ", ".join(selectors)
-    elements = await page.locator(combined_selector).all()
-    
-    id_counter = 0
-    for element in elements:
-        try:
-            # Skip non-visible elements
-            if not await element.is_visible():
-                continue
-
-            accessible_name = await element.evaluate(
-                "(el) => {"
-                "  try {"
-                "    const accessibility = window.getComputedAccessibleNode(el);"
-                "    return accessibility.name;"
-                "  } catch (e) {"
-                "    return el.innerText || el.getAttribute('aria-label') || '';"
-                "  }"
-                "}"
-            )
-            
-            text = (await element.text_content() or "").strip()
-            
-            # Use accessible name as the primary text, fallback to inner text
-            display_text = (accessible_name or text or "").strip()
-
-            # Assign a temporary, unique ID for the LLM to reference
-            element_id = f"llm-element-{id_counter}"
-            await element.evaluate(f"(el, id) => el.setAttribute('data-llm-id', id)", element_id)
-
-            interactive_elements.append({
-                "llm_id": element_id,
-                "text": display_text,
-                "tag": await element.evaluate("el => el.tagName.toLowerCase()"),
-            })
-            id_counter += 1
-            
-        except Exception:
-            # Element might have become detached or is not an element anymore.
-            # It's safe to ignore it.
-            continue
-            
-    return interactive_elements
+    combined_selector = ", ".join(INTERACTIVE_SELECTORS)
+    return await page.evaluate(_COLLECT_JS, combined_selector)
@@ -1,38 +1,62 @@
+import asyncio
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
 from playwright.async_api import Page
 
-async def get_page_accessibility_tree(page: Page, max_length: int = 50000) -> str:
-    """
-    Injects JavaScript to traverse the DOM and return a simplified text representation
-    of interactive elements and important structure (headers, labels).
-    Prioritizes active modals to ensure they aren't truncated.
-    """
-    js_code = """
-    (() => {
+MAX_TREE_LENGTH = 50000
+
+_MODAL_PREFIX = "!!! ACTIVE MODAL DETECTED - FOCUSING ON MODAL CONTENT !!!\n"
+
+# Function expression so it can be evaluated on its own or inlined into a
+# larger page.evaluate payload (see ExecutorAgent._build_observation). Takes
+# the character budget so the walk stops once the output would exceed it.
+ACCESSIBILITY_TREE_JS = """
+    (limit) => {
+        // Per-walk memo: modal candidates and walked nodes are measured once
+        const visibilityCache = new WeakMap();
+
         function isVisible(element) {
-            if (!element.getBoundingClientRect) return false;
-            const rect = element.getBoundingClientRect();
-            if (rect.width === 0 || rect.height === 0) return false;
-            const style = window.getComputedStyle(element);
-            return style.visibility !== 'hidden' && style.display !== 'none' && style.opacity !== '0';
+            const cached = visibilityCache.get(element);
+            if (cached !== undefined) return cached;
+
+            let visible = false;
+            if (element.getBoundingClientRect) {
+                // Zero-size boxes are rejected before paying for getComputedStyle
+                const rect = element.getBoundingClientRect();
+                if (rect.width !== 0 && rect.height !== 0) {
+                    const style = window.getComputedStyle(element);
+                    visible = style.visibility !== 'hidden' && style.display !== 'none' && style.opacity !== '0';
+                }
+            }
+            visibilityCache.set(element, visible);
+            return visible;
         }
 
-        function getSafeText(node) {
-            const tag = node.tagName.toLowerCase();
+        const TIMESTAMP_RE = /^\\d+\\s*(min|h|d|w|mo|y)$/;
+        const GENERIC_PREFIXES = new Set(['project', 'issue', 'doc', 'document']);
+
+        // Runs of whitespace and Linear shortcut/icon noise, cleaned in one pass:
+        // a run collapses to a single space if it had whitespace, else vanishes.
+        const CLEAN_RE = /(?:\\s|[▶⇧]|P then [A-Z]|(?:Ctrl|Alt|Shift|Cmd) [A-Z])+/g;
+        const HAS_SPACE_RE = /\\s/;
+
+        // Helper to check if text looks like a timestamp
+        function isTimestamp(str) {
+            return TIMESTAMP_RE.test(str.trim());
+        }
+
+        // Helper to check if text is a generic prefix
+        function isPrefix(str) {
+            return GENERIC_PREFIXES.has(str.trim().toLowerCase());
+        }
+
+        function getSafeText(node, tag) {
             let text = "";
             
-            // Helper to check if text looks like a timestamp
-            function isTimestamp(str) {
-                return /^\d+\s*(min|h|d|w|mo|y)$/.test(str.trim());
-            }
-            
-            // Helper to check if text is a generic prefix
-            function isPrefix(str) {
-                const trimmed = str.trim().toLowerCase();
-                return ['project', 'issue', 'doc', 'document'].includes(trimmed);
-            }
-            
             // For buttons and links, use smarter extraction
-            if (['a', 'button'].includes(tag)) {
+            if (tag === 'a' || tag === 'button') {
                 // Strategy 1: Look for semantic elements (strong, em, h1-h6) first
                 const semanticSelectors = ['strong', 'b', 'em', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6'];
                 for (const sel of semanticSelectors) {
@@ -61,7 +85,8 @@ async def get_page_accessibility_tree(page: Page, max_length: int = 50000) -> st
                         }
                     );
                     
-                    while (walker.nextNode()) {
+                    // The first few parts hold the label; semantic tags were tried above
+                    while (textParts.length < 3 && walker.nextNode()) {
                         textParts.push(walker.currentNode.textContent.trim());
                     }
                     
@@ -84,82 +109,88 @@ async def get_page_accessibility_tree(page: Page, max_length: int = 50000) -> st
                     text = text.trim();
                 }
             } else {
-                // For other elements, extract only direct text nodes
-                for (let child of node.childNodes) {
-                    if (child.nodeType === Node.TEXT_NODE) {
-                        text += child.textContent;
-                    }
-                }
+                // Headings, labels etc.: textContent needs no layout, unlike innerText
+                text = (node.textContent || "").trim();
                 
-                // If no direct text found, use innerText as fallback
-                if (!text.trim()) {
+                // If no text found, use innerText as fallback
+                if (!text) {
                     text = node.innerText || "";
                 }
             }
             
-            // Clean up Linear-specific shortcuts and icons
-            text = text.replace(/[▶⇧]/g, ''); 
-            text = text.replace(/P then [A-Z]/g, '');
-            text = text.replace(/(Ctrl|Alt|Shift|Cmd) [A-Z]/g, '');
-            return text.replace(/\\s+/g, ' ').trim().slice(0, 50);
+            // Clean up Linear-specific shortcuts and icons, normalize whitespace
+            text = text.replace(CLEAN_RE, (m) => HAS_SPACE_RE.test(m) ? ' ' : '');
+            return text.trim().slice(0, 50);
         }
 
+        const INTERACTIVE_TAGS = new Set(['a', 'button', 'input', 'textarea', 'select', 'details', 'summary']);
+        const INTERACTIVE_ROLES = new Set(['button', 'link', 'checkbox', 'menuitem', 'tab', 'textbox', 'combobox', 'listbox', 'dialog']);
+        const HEADING_TAGS = new Set(['h1', 'h2', 'h3', 'h4', 'h5', 'h6']);
+
+        // Returns the tag/role it read (reused by the emit code) or null
         function isInteresting(node) {
             const tag = node.tagName.toLowerCase();
             const role = node.getAttribute('role');
-            const ariaLabel = node.getAttribute('aria-label');
+            const attrs = { tag, role };
             
             // Interactive elements
-            if (['a', 'button', 'input', 'textarea', 'select', 'details', 'summary'].includes(tag)) return true;
-            if (['button', 'link', 'checkbox', 'menuitem', 'tab', 'textbox', 'combobox', 'listbox', 'dialog'].includes(role)) return true;
-            if (node.getAttribute('contenteditable') === 'true') return true;
+            if (INTERACTIVE_TAGS.has(tag)) return attrs;
+            if (INTERACTIVE_ROLES.has(role)) return attrs;
+            if (node.getAttribute('contenteditable') === 'true') return attrs;
             
             // Structural/Informational
-            if (/^h[1-6]$/.test(tag)) return true;
-            if (tag === 'label') return true;
+            if (HEADING_TAGS.has(tag)) return attrs;
+            if (tag === 'label') return attrs;
             
             // Elements with specific attributes that suggest interactivity
-            if (node.onclick || node.getAttribute('onclick')) return true;
-            if (tag === 'div' && (role === 'button' || node.className.includes('btn') || node.className.includes('button'))) return true;
+            if (node.onclick || node.getAttribute('onclick')) return attrs;
+            if (tag === 'div' && (role === 'button' || node.className.includes('btn') || node.className.includes('button'))) return attrs;
+
+            return null;
+        }
+
+        // Everything isInteresting() can accept; pre-filtering natively means the
+        // JS checks below only run on candidates instead of every element.
+        const CANDIDATE_SELECTOR = [
+            'a', 'button', 'input', 'textarea', 'select', 'details', 'summary', 'label',
+            'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+            '[role]', '[contenteditable="true"]', '[onclick]',
+            'div[class*="btn"]', 'div[class*="button"]'
+        ].join(', ');
+
+        // A node counts as visible only if its whole ancestor chain up to the
+        // root is; this matches the subtree pruning the TreeWalker used to do.
+        const chainCache = new WeakMap();
+
+        function isRendered(node, root) {
+            if (node === root) return true;
+            const cached = chainCache.get(node);
+            if (cached !== undefined) return cached;
 
-            return false;
+            const parent = node.parentElement;
+            const rendered = isVisible(node) && (!parent || isRendered(parent, root));
+            chainCache.set(node, rendered);
+            return rendered;
         }
 
-        function traverse(root) {
+        function traverse(root, budget) {
             const output = [];
-            const outputElements = new Set(); // Track elements we've already output
-            
-            const walker = document.createTreeWalker(
-                root,
-                NodeFilter.SHOW_ELEMENT,
-                {
-                    acceptNode: function(node) {
-                        if (!isVisible(node)) return NodeFilter.FILTER_REJECT;
-                        return NodeFilter.FILTER_ACCEPT;
-                    }
-                }
-            );
+            let used = 0;
+            // querySelectorAll returns document order, so every descendant of an
+            // emitted link/button comes right after it: one contains() check
+            // against the most recent one replaces walking each node's ancestors.
+            let lastEmitted = null;
 
-            while (walker.nextNode()) {
-                const node = walker.currentNode;
+            for (const node of root.querySelectorAll(CANDIDATE_SELECTOR)) {
+                if (!isRendered(node, root)) continue;
                 
                 // Skip if this element is inside an already-output link or button
-                let hasOutputAncestor = false;
-                let parent = node.parentElement;
-                while (parent && parent !== root) {
-                    if (outputElements.has(parent)) {
-                        hasOutputAncestor = true;
-                        break;
-                    }
-                    parent = parent.parentElement;
-                }
-                
-                if (hasOutputAncestor) continue;
+                if (lastEmitted && lastEmitted.contains(node)) continue;
                 
-                if (isInteresting(node)) {
-                    const tag = node.tagName.toLowerCase();
-                    const text = getSafeText(node);
-                    const role = node.getAttribute('role');
+                const attrs = isInteresting(node);
+                if (attrs) {
+                    const { tag, role } = attrs;
+                    const text = getSafeText(node, tag);
                     const ariaLabel = node.getAttribute('aria-label');
                     const placeholder = node.getAttribute('placeholder');
                     const name = node.getAttribute('name');
@@ -177,15 +208,23 @@ async def get_page_accessibility_tree(page: Page, max_length: int = 50000) -> st
                     if (id) parts.push(`id="${id}"`);
                     if (type) parts.push(`type="${type}"`);
                     
-                    if (tag === 'a' && node.getAttribute('href')) {
-                        parts.push(`href="${node.getAttribute('href').slice(0, 30)}..."`);
+                    const href = tag === 'a' ? node.getAttribute('href') : null;
+                    if (href) {
+                        parts.push(`href="${href.slice(0, 30)}..."`);
                     }
 
-                    output.push(parts.join(' '));
+                    const line = parts.join(' ');
+                    // +1 for the newline the lines are joined with
+                    if (used + line.length + 1 > budget) {
+                        output.push('... (truncated)');
+                        break;
+                    }
+                    used += line.length + 1;
+                    output.push(line);
                     
                     // Mark links and buttons as output to skip their children
-                    if (['a', 'button'].includes(tag)) {
-                        outputElements.add(node);
+                    if (tag === 'a' || tag === 'button') {
+                        lastEmitted = node;
                     }
                 }
             }
@@ -203,28 +242,289 @@ async def get_page_accessibility_tree(page: Page, max_length: int = 50000) -> st
         
         let root = document.body;
         let prefix = "";
+        let modalInfo = null;
         
-        for (const sel of modalSelectors) {
-            const modals = document.querySelectorAll(sel);
-            for (const modal of modals) {
-                if (isVisible(modal) && modal.innerText.trim().length > 0) {
-                    root = modal;
-                    prefix = "!!! ACTIVE MODAL DETECTED - FOCUSING ON MODAL CONTENT !!!\\n";
-                    break;
-                }
+        // One selector pass over the document. Candidates come in document
+        // order, so keep the visible one whose selector ranks first (portaled
+        // [role="dialog"] nodes sit at the end of <body>); ties go to the earlier.
+        let modal = null;
+        let modalRank = modalSelectors.length;
+        for (const el of document.querySelectorAll(modalSelectors.join(', '))) {
+            const rank = modalSelectors.findIndex((sel) => el.matches(sel));
+            if (rank >= modalRank) continue;
+            // Native checkVisibility and textContent avoid style/layout work
+            const shown = el.checkVisibility
+                ? el.checkVisibility({ checkOpacity: true, checkVisibilityCSS: true })
+                : isVisible(el);
+            if (shown && el.textContent.trim().length > 0) {
+                modal = el;
+                modalRank = rank;
+                if (rank === 0) break;
             }
-            if (root !== document.body) break;
         }
 
-        const lines = traverse(root);
-        return prefix + lines.join('\\n');
-    })()
+        if (modal) {
+            root = modal;
+            prefix = "!!! ACTIVE MODAL DETECTED - FOCUSING ON MODAL CONTENT !!!\\n";
+            const rect = modal.getBoundingClientRect();
+            modalInfo = {
+                text: modal.innerText.slice(0, 100),
+                rect: { x: rect.x, y: rect.y, width: rect.width, height: rect.height },
+            };
+        }
+
+        const lines = traverse(root, limit - prefix.length);
+        return { modal: modalInfo, tree: prefix + lines.join('\\n') };
+    }
+"""
+
+
+@dataclass
+class AccessibilitySnapshot:
+    """Result of one tree walk: the rendered tree plus the modal it was rooted at."""
+    tree: str
+    modal: Optional[Dict[str, Any]] = None
+
+
+def truncate_tree(tree: str, max_length: int = MAX_TREE_LENGTH) -> str:
+    if len(tree) > max_length:
+        return tree[:max_length] + "\n... (truncated)"
+    return tree
+
+
+# Same selection rules as isInteresting() in the JS walker, applied to the
+# browser's own accessibility tree (AX roles) plus the backing DOM element.
+_AX_INTERESTING_TAGS = {
+    "a", "button", "input", "textarea", "select", "details", "summary", "label",
+    "h1", "h2", "h3", "h4", "h5", "h6",
+}
+_AX_INTERESTING_ROLES = {
+    "button", "link", "checkbox", "menuitem", "tab", "textbox", "combobox",
+    "listbox", "dialog", "searchbox", "heading", "LabelText",
+}
+_AX_MODAL_ROLES = {"dialog", "alertdialog"}
+_AX_ATTRS = ("role", "aria-label", "placeholder", "name", "id", "type")
+_WS_RE = re.compile(r"\s+")
+
+DomIndex = Dict[int, Tuple[str, Dict[str, str]]]
+
+
+def _index_dom(root: Dict[str, Any]) -> DomIndex:
+    """Map backendNodeId -> (tag, attributes) for every element in a DOM.getDocument result."""
+    index: DomIndex = {}
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        if node.get("nodeType") == 1:
+            attrs = node.get("attributes") or []
+            index[node["backendNodeId"]] = (
+                node["nodeName"].lower(),
+                dict(zip(attrs[::2], attrs[1::2])),
+            )
+        stack.extend(node.get("children") or ())
+        stack.extend(node.get("shadowRoots") or ())
+        if node.get("contentDocument"):
+            stack.append(node["contentDocument"])
+    return index
+
+
+def _format_ax_line(tag: str, attrs: Dict[str, str], name: str) -> str:
+    parts = [f"[{tag}]"]
+
+    text = _WS_RE.sub(" ", name).strip()[:50]
+    if text:
+        parts.append(f'"{text}"')
+    for key in _AX_ATTRS:
+        if attrs.get(key):
+            parts.append(f'{key}="{attrs[key]}"')
+
+    if tag == "a" and attrs.get("href"):
+        parts.append(f'href="{attrs["href"][:30]}..."')
+
+    return " ".join(parts)
+
+
+def _is_interesting_ax(role: str, tag: str, attrs: Dict[str, str]) -> bool:
+    if tag in _AX_INTERESTING_TAGS or role in _AX_INTERESTING_ROLES:
+        return True
+    if attrs.get("contenteditable") == "true" or "onclick" in attrs:
+        return True
+    classes = attrs.get("class", "")
+    return tag == "div" and ("btn" in classes or "button" in classes)
+
+
+def _ax_role(node: Dict[str, Any]) -> str:
+    return (node.get("role") or {}).get("value", "")
+
+
+def _ax_name(node: Dict[str, Any]) -> str:
+    return str((node.get("name") or {}).get("value", ""))
+
+
+def _ax_modal_rank(node: Dict[str, Any], tag: str, attrs: Dict[str, str]) -> Optional[int]:
+    """Index into the JS walker's modalSelectors list this node matches first, if any."""
+    if attrs.get("role") == "dialog" or _ax_role(node) in _AX_MODAL_ROLES:
+        return 0
+    classes = attrs.get("class", "")
+    if "modal" in classes:
+        return 1
+    if "dialog" in classes:
+        return 2
+    if attrs.get("aria-modal") == "true":
+        return 3
+    style = attrs.get("style", "")
+    if tag == "div" and "z-index" in style and "fixed" in style:
+        return 4
+    return None
+
+
+def _ax_text(nodes: Dict[str, Dict[str, Any]], node_id: str, limit: int = 100) -> Optional[str]:
+    """
+    Names of the non-ignored nodes under node_id, joined up to limit chars;
+    None when everything below it is ignored (hidden or empty).
     """
-    
+    parts: List[str] = []
+    used = 0
+    found = False
+    stack = list(reversed((nodes.get(node_id) or {}).get("childIds") or ()))
+    while stack and used < limit:
+        node = nodes.get(stack.pop())
+        if node is None:
+            continue
+        if not node.get("ignored"):
+            found = True
+            name = _ax_name(node).strip()
+            if name:
+                parts.append(name)
+                used += len(name) + 1
+                # A named node's text already covers its children
+                continue
+        stack.extend(reversed(node.get("childIds") or ()))
+    return " ".join(parts)[:limit] if found else None
+
+
+def _find_ax_modal(
+    nodes: Dict[str, Dict[str, Any]], root_id: str, elements: DomIndex
+) -> Optional[Tuple[Dict[str, Any], str]]:
+    """
+    Same pick as the JS walker: among dialog-like nodes with visible content,
+    the one whose selector ranks first, then document order. Returns the node
+    and its text.
+    """
+    best = None
+    best_rank = None
+    stack = [root_id]
+    while stack:
+        node = nodes.get(stack.pop())
+        if node is None:
+            continue
+        tag, attrs = elements.get(node.get("backendDOMNodeId"), ("", {}))
+        rank = _ax_modal_rank(node, tag, attrs)
+        if rank is not None and (best_rank is None or rank < best_rank):
+            text = _ax_text(nodes, node["nodeId"])
+            if text is not None or (not node.get("ignored") and _ax_name(node).strip()):
+                best = (node, _ax_name(node).strip()[:100] or text or "")
+                best_rank = rank
+                if rank == 0:
+                    break
+        stack.extend(reversed(node.get("childIds") or ()))
+    return best
+
+
+def _render_ax_lines(nodes: Dict[str, Dict[str, Any]], root_id: str, elements: DomIndex, budget: int) -> List[str]:
+    lines: List[str] = []
+    used = 0
+    stack = [root_id]
+    while stack:
+        node = nodes.get(stack.pop())
+        if node is None:
+            continue
+
+        tag, attrs = elements.get(node.get("backendDOMNodeId"), ("", {}))
+        if tag and not node.get("ignored") and _is_interesting_ax(_ax_role(node), tag, attrs):
+            line = _format_ax_line(tag, attrs, _ax_name(node))
+            # +1 for the newline the lines are joined with
+            if used + len(line) + 1 > budget:
+                lines.append("... (truncated)")
+                break
+            used += len(line) + 1
+            lines.append(line)
+
+            # Children of links and buttons are covered by their accessible name
+            if tag in ("a", "button"):
+                continue
+
+        stack.extend(reversed(node.get("childIds") or ()))
+    return lines
+
+
+async def get_cdp_snapshot(page: Page, max_length: int) -> AccessibilitySnapshot:
+    """
+    Build the tree from CDP's Accessibility.getFullAXTree, which Chromium
+    already maintains, instead of re-deriving it with an injected DOM walk.
+    Raises if the page is not backed by Chromium.
+    """
+    cdp = await page.context.new_cdp_session(page)
+    try:
+        ax, dom = await asyncio.gather(
+            cdp.send("Accessibility.getFullAXTree"),
+            cdp.send("DOM.getDocument", {"depth": -1, "pierce": True}),
+        )
+        if not ax["nodes"]:
+            return AccessibilitySnapshot(tree="")
+
+        nodes = {n["nodeId"]: n for n in ax["nodes"]}
+        elements = _index_dom(dom["root"])
+        root_id = ax["nodes"][0]["nodeId"]
+        prefix = ""
+        modal = None
+
+        found = _find_ax_modal(nodes, root_id, elements)
+        if found is not None:
+            modal_node, modal_text = found
+            root_id = modal_node["nodeId"]
+            prefix = _MODAL_PREFIX
+            modal = {"text": modal_text, "rect": None}
+            try:
+                box = await cdp.send("DOM.getBoxModel", {"backendNodeId": modal_node["backendDOMNodeId"]})
+                quad = box["model"]["border"]
+                modal["rect"] = {
+                    "x": quad[0], "y": quad[1],
+                    "width": box["model"]["width"], "height": box["model"]["height"],
+                }
+            except Exception:
+                pass
+    finally:
+        try:
+            await cdp.detach()
+        except Exception:
+            pass
+
+    lines = _render_ax_lines(nodes, root_id, elements, max_length - len(prefix))
+    return AccessibilitySnapshot(tree=prefix + "\n".join(lines), modal=modal)
+
+
+async def get_page_accessibility_tree(page: Page, max_length: int = MAX_TREE_LENGTH) -> AccessibilitySnapshot:
+    """
+    Return a simplified text representation of interactive elements and
+    important structure (headers, labels). Uses Chromium's accessibility tree
+    over CDP when available and falls back to the injected JavaScript walker.
+    Prioritizes active modals to ensure they aren't truncated; the modal found
+    during the same walk is returned alongside the tree.
+    """
+    try:
+        snapshot = await get_cdp_snapshot(page, max_length)
+        snapshot.tree = truncate_tree(snapshot.tree, max_length)
+        return snapshot
+    except Exception:
+        pass
+
     try:
-        tree = await page.evaluate(js_code)
-        if len(tree) > max_length:
-            return tree[:max_length] + "\n... (truncated)"
-        return tree
+        snapshot = await page.evaluate(ACCESSIBILITY_TREE_JS, max_length)
+        # The walk already stops at the budget; truncate_tree is a safety net
+        return AccessibilitySnapshot(
+            tree=truncate_tree(snapshot["tree"], max_length),
+            modal=snapshot["modal"],
+        )
     except Exception as e:
-        return f"Error generating accessibility tree: {str(e)}"
+        return AccessibilitySnapshot(tree=f"Error generating accessibility tree: {str(e)}")
@@ -1,9 +1,19 @@
+import asyncio
 import os
 import uuid
 from datetime import datetime
 from typing import Optional, Dict, Any
 from playwright.async_api import Page
 
+_VIEWPORT_JS = """() => {
+    return {
+      width: window.innerWidth,
+      height: window.innerHeight,
+      scrollX: window.scrollX,
+      scrollY: window.scrollY
+    };
+}"""
+
 
 def _safe_name(name: str) -> str:
     safe = "".join(c if c.isalnum() or c in ".-_" else "_" for c in name)
@@ -37,12 +47,16 @@ class ScreenshotManager:
             
         filepath = os.path.join(folder, filename)
 
+        # Viewport read is independent of the screenshot; overlap the two
+        viewport_task = asyncio.create_task(page.evaluate(_VIEWPORT_JS))
+
         try:
             await page.screenshot(path=filepath, full_page=full_page)
         except Exception:
             try:
                 await page.screenshot(path=filepath, full_page=False)
             except Exception as e:
+                viewport_task.cancel()
                 raise RuntimeError(f"Screenshot failed: {e}") from e
 
         page_url = None
@@ -53,17 +67,7 @@ class ScreenshotManager:
             page_url = None
 
         try:
-            clip = await page.evaluate(
-                """() => {
-                    return {
-                      width: window.innerWidth,
-                      height: window.innerHeight,
-                      scrollX: window.scrollX,
-                      scrollY: window.scrollY
-                    };
-                }"""
-            )
-            viewport = clip
+            viewport = await viewport_task
         except Exception:
             viewport = None
 
@@ -1,7 +1,6 @@
 # ui_state_detector.py
-from playwright.async_api import Page, Locator
 import asyncio
-import time
+from playwright.async_api import Page, Locator, TimeoutError as PlaywrightTimeoutError
 
 async def detect_state_change(page: Page, timeout: float = 2.0, poll: float = 0.2) -> bool:
     """
@@ -10,12 +9,15 @@ async def detect_state_change(page: Page, timeout: float = 2.0, poll: float = 0.
     """
     try:
         before = await page.evaluate("window.__mutationCount || 0")
-        end = time.time() + timeout
-        while time.time() < end:
-            await asyncio.sleep(poll)
-            after = await page.evaluate("window.__mutationCount || 0")
-            if after > before:
-                return True
+        # The browser polls the counter itself and answers once
+        await page.wait_for_function(
+            "(prev) => (window.__mutationCount || 0) > prev",
+            arg=before,
+            polling=poll * 1000,
+            timeout=timeout * 1000,
+        )
+        return True
+    except PlaywrightTimeoutError:
         return False
     except Exception:
         return False
@@ -25,6 +27,19 @@ async def find_active_modal(page: Page) -> Locator | None:
     Finds if there is an active modal dialog on the page.
     A common heuristic for modals is the `role="dialog"` attribute.
     """
+    # Fast path: state kept up to date by the init script's MutationObserver
+    try:
+        has_modal = await page.evaluate(
+            "window.__llmActiveModal ? window.__llmActiveModal() : null"
+        )
+        if has_modal is True:
+            return page.locator("[data-llm-active-modal]").first
+        if has_modal is False:
+            return None
+    except Exception:
+        pass
+
+    # Page was loaded without the init scripts: probe the selectors directly
     try:
         # Broader modal detection strategy
         selectors = [
@@ -35,14 +50,16 @@ async def find_active_modal(page: Page) -> Locator | None:
             'div[style*="z-index"][style*="fixed"]' # Heuristic for overlays
         ]
         
-        for selector in selectors:
-            try:
-                locator = page.locator(selector).first
-                if await locator.is_visible():
-                    return locator
-            except:
-                continue
-                
+        # Probe all selectors concurrently, then keep the priority order above
+        locators = [page.locator(selector).first for selector in selectors]
+        visible = await asyncio.gather(
+            *(locator.is_visible() for locator in locators),
+            return_exceptions=True,
+        )
+        for locator, is_visible in zip(locators, visible):
+            if is_visible is True:
+                return locator
+
         return None
     except Exception:
         # No modal found or it's not visible
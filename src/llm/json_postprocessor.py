@@ -3,17 +3,21 @@
 Utilities to extract and clean JSON produced by LLMs.
 
 Improvements:
-- _remove_comments now only strips comments that are outside of quoted strings,
-  avoiding accidental removal of '//' inside URLs or other string values.
+- Comments are only stripped outside of quoted strings, avoiding accidental
+  removal of '//' inside URLs or other string values.
 - Conservative repairs, extraction of the first balanced JSON block,
   fix for broken quoted strings (joining stray newlines inside quotes),
   and progressive parsing attempts with informative ParseError.detail.
+- Comment stripping, broken-string repair and block extraction share a
+  single scan (_scan_json).
 """
 
 import re
 import json
 from typing import Optional, Dict, Any
 
+import orjson
+
 
 class ParseError(ValueError):
     def __init__(self, message: str, detail: Dict[str, Any]):
@@ -21,87 +25,44 @@ class ParseError(ValueError):
         self.detail = detail
 
 
-# -------------------------
-# Basic helpers / cleaners
-# -------------------------
-def _remove_fences(text: str) -> str:
-    text = re.sub(r"```(?:json)?\s*", "", text, flags=re.IGNORECASE)
-    text = re.sub(r"\s*```", "", text)
-    text = re.sub(r"~~~(?:json)?\s*", "", text, flags=re.IGNORECASE)
-    text = re.sub(r"\s*~~~", "", text)
-    return text.strip()
-
-
-def _remove_comments(text: str) -> str:
-    """
-    Remove JavaScript style // and /* */ comments **only when they are outside
-    of JSON double-quoted strings**. This scans char-by-char tracking whether
-    we are inside a string (respecting backslash escapes).
-    """
-    if not text:
-        return text
-
-    out = []
-    i = 0
-    n = len(text)
-    in_string = False
-    escape = False
-
-    while i < n:
-        ch = text[i]
-
-        if escape:
-            out.append(ch)
-            escape = False
-            i += 1
-            continue
+# Compiled once at import; every LLM response goes through these
+_FENCE_JSON = re.compile(r"```(?:json)?\s*", re.IGNORECASE)
+_FENCE_END = re.compile(r"\s*```")
+_TILDE_JSON = re.compile(r"~~~(?:json)?\s*", re.IGNORECASE)
+_TILDE_END = re.compile(r"\s*~~~")
+_TRAIL_COMMA = re.compile(r",\s*(?=[}\]])")
+_SQ_KEY = re.compile(r"(?<=\{|\[|\s)'([A-Za-z0-9_\- ]+)'\s*:")
+_SQ_VALUE = re.compile(r":\s*'([^']*)'(?=\s*[,\}\]])")
+_UNESCAPED_SQ = re.compile(r"(?<!\\)'")
 
-        if ch == "\\":
-            # start escape sequence inside string (or literal backslash)
-            out.append(ch)
-            escape = True
-            i += 1
-            continue
+_SMART_QUOTES = str.maketrans({"“": '"', "”": '"', "‘": "'", "’": "'"})
 
-        if ch == '"' :
-            # toggle string state and output the quote
-            in_string = not in_string
-            out.append(ch)
-            i += 1
-            continue
 
-        if not in_string and ch == "/" and i + 1 < n:
-            nxt = text[i + 1]
-            if nxt == "/":
-                # line comment outside string: skip until end of line
-                i += 2
-                while i < n and text[i] not in ("\n", "\r"):
-                    i += 1
-                # keep the newline char so structure/line numbers preserved
-                continue
-            elif nxt == "*":
-                # block comment outside string: skip until closing */
-                i += 2
-                while i + 1 < n:
-                    if text[i] == "*" and text[i + 1] == "/":
-                        i += 2
-                        break
-                    i += 1
-                continue
+# -------------------------
+# Basic helpers / cleaners
+# -------------------------
+def _loads(text: str):
+    """orjson first; stdlib json for inputs orjson rejects (e.g. NaN/Infinity)."""
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return json.loads(text)
 
-        # default: copy char
-        out.append(ch)
-        i += 1
 
-    return "".join(out)
+def _remove_fences(text: str) -> str:
+    text = _FENCE_JSON.sub("", text)
+    text = _FENCE_END.sub("", text)
+    text = _TILDE_JSON.sub("", text)
+    text = _TILDE_END.sub("", text)
+    return text.strip()
 
 
 def _replace_smart_quotes(text: str) -> str:
-    return text.replace("“", '"').replace("”", '"').replace("‘", "'").replace("’", "'")
+    return text.translate(_SMART_QUOTES)
 
 
 def _remove_trailing_commas(text: str) -> str:
-    return re.sub(r",\s*(?=[}\]])", "", text)
+    return _TRAIL_COMMA.sub("", text)
 
 
 def _replace_single_quotes_conservative(text: str) -> str:
@@ -110,9 +71,9 @@ def _replace_single_quotes_conservative(text: str) -> str:
     in a conservative way (only when they look like JSON keys or JSON values).
     """
     # 'key':  -> "key":
-    text = re.sub(r"(?<=\{|\[|\s)'([A-Za-z0-9_\- ]+)'\s*:", r'"\1":', text)
+    text = _SQ_KEY.sub(r'"\1":', text)
     # : 'value' (before comma or closing brace/bracket)
-    text = re.sub(r":\s*'([^']*)'(?=\s*[,\}\]])", r': "\1"', text)
+    text = _SQ_VALUE.sub(r': "\1"', text)
     return text
 
 
@@ -170,42 +131,132 @@ def extract_first_json(text: str) -> Optional[str]:
 
 
 # -------------------------------------------------------
-# Fix quoted strings that were split across newlines
+# Single-pass scanner: comments, broken strings, JSON span
 # -------------------------------------------------------
-def _fix_broken_quoted_strings(text: str) -> str:
+def _skip_comment(text: str, i: int) -> int:
+    """Index just past a // or /* */ comment starting at i; i itself if none does."""
+    n = len(text)
+    if text[i] != "/" or i + 1 >= n:
+        return i
+    nxt = text[i + 1]
+    if nxt == "/":
+        # line comment: skip until end of line, keep the newline
+        i += 2
+        while i < n and text[i] not in ("\n", "\r"):
+            i += 1
+    elif nxt == "*":
+        # block comment: skip until closing */
+        i += 2
+        while i + 1 < n:
+            if text[i] == "*" and text[i + 1] == "/":
+                i += 2
+                break
+            i += 1
+    return i
+
+
+def _scan_json(text: str) -> str:
     """
-    Remove stray newlines that appear inside JSON double-quoted strings,
-    preserving escape sequences.
+    One char-by-char pass that
+    - strips // and /* */ comments found outside double-quoted strings,
+    - replaces stray newlines inside double-quoted strings with a space,
+    - keeps only the first balanced {...} / [...] block (or everything from
+      its opening bracket if the JSON is truncated).
+    Like extract_first_json, quotes are only tracked from the first opening
+    bracket on, so prose before the JSON cannot desync it; comments in that
+    prose are skipped so a bracket inside one does not start the span.
+    If the brackets do not balance the whole cleaned text is returned.
     """
-    out_chars = []
+    n = len(text)
+    # Prose before the first bracket is copied through minus its comments
+    # (quotes there only decide what counts as a comment), so a bracket inside
+    # a leading comment does not start the span
+    head = []
+    i = 0
+    in_string = False
+    escape = False
+    while i < n and text[i] not in ("{", "["):
+        ch = text[i]
+        j = i if in_string or escape else _skip_comment(text, i)
+        if j != i:
+            i = j
+            continue
+        if escape:
+            escape = False
+        elif ch == "\\":
+            escape = True
+        elif ch == '"':
+            in_string = not in_string
+        head.append(ch)
+        i += 1
+    if i == n:
+        # no JSON block: scan the whole text as before
+        head = []
+        i = 0
+    out = []
     in_string = False
     escape = False
+    stack = []
+    start = None
+    end = None
+    balanced = True
+
+    while i < n:
+        ch = text[i]
 
-    for ch in text:
         if escape:
-            out_chars.append(ch)
+            out.append(ch)
             escape = False
+            i += 1
             continue
 
         if ch == "\\":
-            out_chars.append(ch)
+            out.append(ch)
             escape = True
+            i += 1
             continue
 
-        if ch == '"' and not escape:
+        if ch == '"':
             in_string = not in_string
-            out_chars.append(ch)
+            out.append(ch)
+            i += 1
             continue
 
-        if in_string and ch in ("\n", "\r"):
-            # replace newline inside a quoted string with a single space (avoid collapsing structure)
-            if out_chars and out_chars[-1] != " ":
-                out_chars.append(" ")
+        if in_string:
+            if ch in ("\n", "\r"):
+                # join split lines with a single space (avoid collapsing structure)
+                if out and out[-1] != " ":
+                    out.append(" ")
+            else:
+                out.append(ch)
+            i += 1
             continue
 
-        out_chars.append(ch)
+        if ch == "/":
+            j = _skip_comment(text, i)
+            if j != i:
+                i = j
+                continue
+
+        if balanced and ch in ("{", "[", "}", "]"):
+            if ch in ("{", "["):
+                if start is None:
+                    start = len(out)
+                stack.append(ch)
+            elif start is not None:
+                if not stack or stack.pop() != ("{" if ch == "}" else "["):
+                    balanced = False
+                elif not stack:
+                    out.append(ch)
+                    end = len(out)
+                    break
 
-    return "".join(out_chars)
+        out.append(ch)
+        i += 1
+
+    if start is None or not balanced:
+        return "".join(head) + "".join(out)
+    return "".join(out[start:end])
 
 
 # -------------------------
@@ -217,19 +268,14 @@ def clean_json_text(text: Optional[str]) -> str:
 
     t = text
     t = _remove_fences(t)
-    t = _remove_comments(t)          # now safe relative to strings
     t = _replace_smart_quotes(t)
 
-    # If there is extra prose surrounding JSON, extract the first JSON block
-    extracted = extract_first_json(t)
-    if extracted:
-        t = extracted
-
     # conservative single-quote fixes
     t = _replace_single_quotes_conservative(t)
 
-    # fix broken quoted strings (join split lines inside quotes)
-    t = _fix_broken_quoted_strings(t)
+    # strip comments, join split lines inside quotes and extract the first
+    # JSON block in one pass
+    t = _scan_json(t)
 
     # remove trailing commas
     t = _remove_trailing_commas(t)
@@ -250,24 +296,34 @@ def parse_json_from_llm(text: Optional[str]):
     # Attempt 0: direct parse
     try:
         attempts["direct"] = {"success": True, "text": original}
-        return json.loads(original)
+        return _loads(original)
     except Exception as e:
         attempts["direct"] = {"success": False, "error": str(e)}
 
-    # Attempt 1: cleaned
+    # Attempt 1: clean JSON wrapped in prose or fences - only drop the fences
+    # and comments and extract the block, skipping the quote/comma repairs
+    span = _scan_json(_remove_fences(original))
+    if span and span != original:
+        try:
+            attempts["span"] = {"success": True, "text": span}
+            return _loads(span)
+        except Exception as e:
+            attempts["span"] = {"success": False, "error": str(e), "text": span}
+
+    # Attempt 2: cleaned
     cleaned = clean_json_text(original)
     try:
         attempts["cleaned"] = {"success": True, "text": cleaned}
-        return json.loads(cleaned)
+        return _loads(cleaned)
     except Exception as e:
         attempts["cleaned"] = {"success": False, "error": str(e), "text": cleaned}
 
-    # Attempt 2: aggressive fallback - replace remaining single quotes inside strings and try again
-    aggressive = re.sub(r"(?<!\\)'", '"', cleaned)  # naive fallback: replace remaining single quotes with double quotes
+    # Attempt 3: aggressive fallback - replace remaining single quotes inside strings and try again
+    aggressive = _UNESCAPED_SQ.sub('"', cleaned)  # naive fallback: replace remaining single quotes with double quotes
     aggressive = _remove_trailing_commas(aggressive)
     try:
         attempts["aggressive"] = {"success": True, "text": aggressive}
-        return json.loads(aggressive)
+        return _loads(aggressive)
     except Exception as e:
         attempts["aggressive"] = {"success": False, "error": str(e), "text": aggressive}
 
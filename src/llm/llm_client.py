@@ -1,12 +1,14 @@
+import functools
 import os
 import json
-from dotenv import load_dotenv
 from google.genai import Client
 from google.genai import types
+from pydantic import BaseModel, ConfigDict, ValidationError, field_validator, model_validator
+from typing import Any, Optional
 from .json_postprocessor import parse_json_from_llm, ParseError
 
-load_dotenv()
-
+# Templates never change while the process runs; read each from disk once
+@functools.lru_cache(maxsize=32)
 def load_prompt(name: str) -> str:
     script_dir = os.path.dirname(os.path.abspath(__file__))
     prompt_path = os.path.join(script_dir, "prompt_templates", name)
@@ -16,6 +18,43 @@ def load_prompt(name: str) -> str:
 
 SYSTEM_PROMPT = load_prompt("base_prompt.txt")
 
+
+class _PlannedStep(BaseModel):
+    """Shape check for one raw LLM step; unknown keys pass through untouched."""
+    model_config = ConfigDict(extra="allow")
+
+    action: str
+    selector: Optional[str] = None
+    value: Any = None
+
+    @field_validator("selector", mode="before")
+    @classmethod
+    def _coerce_selector(cls, sel):
+        if sel is None:
+            return None
+        # If it's not None and not a string, that's an issue, but let's be lenient
+        return sel.strip() if isinstance(sel, str) else str(sel)
+
+    @model_validator(mode="after")
+    def _check_navigate(self):
+        if self.action == "navigate":
+            # Ensure value is present
+            if not self.value:
+                raise ValueError("navigate step without a value")
+            self.selector = None
+        return self
+
+
+def _validate_steps(steps) -> list:
+    """Keep the rows that look like steps, dropping the rest."""
+    cleaned = []
+    for s in steps:
+        try:
+            cleaned.append(_PlannedStep.model_validate(s).model_dump())
+        except ValidationError:
+            continue
+    return cleaned
+
 class LLMClient:
     def __init__(self):
         key = os.getenv("GEMINI_API_KEY")
@@ -30,25 +69,29 @@ class LLMClient:
 
         self.client = Client(api_key=key)
 
-    def plan(self, task: str, observation: str = None, history: list = None):
+    async def plan(self, task: str, observation: str = None, history: list = None):
 
 
         if self.client is None:
             return self._fallback()
 
-        prompt = SYSTEM_PROMPT + "\nUser task: " + task
+        # Collect fragments and join once; history can grow long
+        parts = [SYSTEM_PROMPT, "\nUser task: ", task]
         
         if history:
-            prompt += "\n\nPREVIOUS ACTIONS (HISTORY):\n"
+            parts.append("\n\nPREVIOUS ACTIONS (HISTORY):\n")
             for step in history:
                 status = "Success" if step.success else f"Failed: {step.error}"
-                prompt += f"- Step {step.step_index}: {step.action} {step.details} -> {status}\n"
+                parts.append(f"- Step {step.step_index}: {step.action} {step.details} -> {status}\n")
 
         if observation:
-            prompt +=f"\n\nCURRENT PAGE OBSERVATION:\n{observation}\n\nBased on this observation, what are the NEXT steps? If the task is complete, return an empty list []."
+            parts.append(f"\n\nCURRENT PAGE OBSERVATION:\n{observation}\n\nBased on this observation, what are the NEXT steps? If the task is complete, return an empty list [].")
+
+        prompt = "".join(parts)
 
         try:
-            response = self.client.models.generate_content(
+            # Async client: the event loop (browser, graph) keeps running during inference
+            response = await self.client.aio.models.generate_content(
                 model=self.model,
                 contents=[{"role": "user", "parts": [{"text": prompt}]}],
             )
@@ -57,30 +100,7 @@ class LLMClient:
 
             steps = parse_json_from_llm(raw)
 
-            cleaned = []
-
-            for s in steps:
-                if "action" not in s:
-                    continue
-
-                if s["action"] == "navigate":
-                    # Ensure value is present
-                    if not s.get("value"):
-                        continue
-                    s["selector"] = None
-                    cleaned.append(s)
-                    continue
-
-                sel = s.get("selector")
-                if sel is None:
-                    s["selector"] = None
-                elif not isinstance(sel, str):
-                    # If it's not None and not a string, that's an issue, but let's be lenient
-                    s["selector"] = str(sel)
-                else:
-                    s["selector"] = sel.strip()
-                
-                cleaned.append(s)
+            cleaned = _validate_steps(steps)
 
             # We no longer force a navigate step here. 
             # The LLM should provide it based on the prompt.
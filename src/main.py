@@ -1,58 +1,101 @@
 # src/main.py
 
+from __future__ import annotations
+
 import asyncio
 import argparse
-import json
+import hashlib
+import os
 import sys
-from agents.orchestrator_agent import OrchestratorAgent
-from agents.executor_agent import ExecutorAgent
-from agents.message_protocol import AgentState
-from graph.langgraph_builder import build_graph
-from automation.action_engine import ActionEngine
-from dotenv import load_dotenv
+from collections import OrderedDict
+from typing import TYPE_CHECKING
+
+# Agent, graph and Playwright modules are imported where they are first used, so
+# `main.py --help` (or importing this module) does not pay for loading them.
+if TYPE_CHECKING:
+    from agents.message_protocol import AgentState, Plan
+
+# Idle executor agents. Each run checks one out (passed to executor_node via the
+# graph config) so its browser persists across graph steps, concurrent runs in
+# one process get separate pages, and a finished run's browser serves the next.
+_executor_pool: asyncio.Queue = asyncio.Queue()
+# Likewise for the planner, so its LLM client is built once per process
+_orchestrator_agent = None
+# Plans by fingerprint of what the planner sees; an unchanged page and history
+# length reuses the earlier plan instead of another LLM call. LRU-bounded, as
+# every new page adds a key and the process may serve many runs.
+_plan_cache: OrderedDict[bytes, Plan] = OrderedDict()
+_PLAN_CACHE_SIZE = 64
+# Plan/execute rounds per run; matches the graph path's recursion_limit of 100
+_MAX_ITERATIONS = 50
+
+def _acquire_executor():
+    try:
+        return _executor_pool.get_nowait()
+    except asyncio.QueueEmpty:
+        from agents.executor_agent import ExecutorAgent
+        return ExecutorAgent(headless=False)
+
 
-load_dotenv()
+def _release_executor(agent):
+    _executor_pool.put_nowait(agent)
 
-# Global agent instance to persist browser across graph steps
-_executor_agent = None
 
-def planner_node(state: AgentState):
-    orch = OrchestratorAgent()
+async def _close_executors():
+    while not _executor_pool.empty():
+        await _executor_pool.get_nowait().stop()
+
+
+async def planner_node(state: AgentState):
+    global _orchestrator_agent
+    if _orchestrator_agent is None:
+        from agents.orchestrator_agent import OrchestratorAgent
+        _orchestrator_agent = OrchestratorAgent()
+    orch = _orchestrator_agent
     
     # Extract history if available
     history = []
     if state.execution and state.execution.steps:
         history = state.execution.steps
         
-    # Pass observation and history to planner
-    plan = orch.create_plan(state.task, state.observation, history)
+    key = hashlib.blake2b(
+        f"{state.task}|{state.observation}|{len(history)}".encode(), digest_size=16
+    ).digest()
+    plan = _plan_cache.get(key)
+    if plan is None:
+        # Pass observation and history to planner
+        plan = await orch.create_plan(state.task, state.observation, history)
+        _plan_cache[key] = plan
+        if len(_plan_cache) > _PLAN_CACHE_SIZE:
+            _plan_cache.popitem(last=False)
+    else:
+        _plan_cache.move_to_end(key)
 
     # If plan is empty, we are done
     is_final = len(plan.steps) == 0
 
-    return state.model_copy(update={
+    # Only the fields the planner owns
+    return {
         "plan": plan,
         "final": is_final
-    })
+    }
 
 
-async def executor_node(state: AgentState):
-    global _executor_agent
-    if _executor_agent is None:
-        _executor_agent = ExecutorAgent(headless=False)
+async def executor_node(state: AgentState, config):
+    executor = config["configurable"]["executor"]
 
     # Calculate start_step_index from existing history
     start_step_index = 0
     if state.execution and state.execution.steps:
         start_step_index = len(state.execution.steps)
 
-    # Execute steps using the persistent agent
+    # Execute steps using the run's agent
     # Pass existing_page to reuse the browser
-    execution = await _executor_agent.execute(
+    execution = await executor.execute(
         state.task,
         state.plan.steps,
         keep_open=state.keep_open,
-        existing_page=_executor_agent.page,
+        existing_page=executor.page,
         start_step_index=start_step_index
     )
 
@@ -67,14 +110,11 @@ async def executor_node(state: AgentState):
         # Reset retry count on success to allow long tasks
         new_retry_count = 0
 
-    # Accumulate history
-    current_steps = []
-    if state.execution and state.execution.steps:
-        current_steps.extend(state.execution.steps)
-    current_steps.extend(execution.steps)
-    
-    # Update execution object with accumulated steps
-    execution.steps = current_steps
+    # Accumulate history: grow the existing list in place (O(new steps))
+    # instead of copying the whole history on every iteration
+    if state.execution:
+        state.execution.steps.extend(execution.steps)
+        execution.steps = state.execution.steps
 
     new_state = state.model_copy(update={
         "execution": execution,
@@ -85,7 +125,51 @@ async def executor_node(state: AgentState):
     return new_state
 
 
-async def run(task: str, keep_open: bool = False):
+def _summarize(final) -> dict:
+    get = final.get if isinstance(final, dict) else (lambda key: getattr(final, key, None))
+    execution = get("execution")
+    steps = execution.steps if execution else []
+    return {
+        "task": get("task"),
+        "num_steps": len(steps),
+        "success": execution is not None and not execution.error,
+        "final_url": steps[-1].page_url if steps else None,
+    }
+
+
+def _print_final(final, verbose: bool):
+    print("=== Task Completed ===")
+
+    import json
+    if not verbose:
+        # Full state grows with every step; print a summary unless asked
+        print(json.dumps(_summarize(final), indent=2))
+    # Support both Pydantic models (have .model_dump_json()) and plain dicts
+    elif hasattr(final, "model_dump_json") and callable(getattr(final, "model_dump_json")):
+        print(final.model_dump_json(indent=2))
+    else:
+        try:
+            out = json.dumps(final, indent=2)
+        except TypeError:
+            # some inner types may not be JSON-serializable; pretty-print fallback
+            import pprint
+            out = pprint.pformat(final, indent=2)
+        print(out)
+
+
+async def _run_loop(initial: AgentState, config) -> AgentState:
+    # Same planner -> executor -> should_continue flow as the graph, without
+    # LangGraph's per-step channel/state rebuild
+    state = initial
+    for _ in range(_MAX_ITERATIONS):
+        state = state.model_copy(update=await planner_node(state))
+        state = await executor_node(state, config)
+        if not state.should_continue():
+            break
+    return state
+
+
+async def run(task: str, keep_open: bool = False, verbose: bool = False, use_graph: bool = False):
     # We need to modify the graph builder to support the loop
     # Ideally we'd change langgraph_builder.py, but we can also just loop here if the graph is simple.
     # However, the proper way is to update the graph definition.
@@ -94,45 +178,84 @@ async def run(task: str, keep_open: bool = False):
     # We need to update langgraph_builder.py to loop back to planner if not final.
     # But first let's set up the nodes here.
     
-    graph = build_graph(planner_node, executor_node)
+    # The key may already come from the real environment; skip the .env read then
+    if not os.environ.get("GEMINI_API_KEY"):
+        from dotenv import load_dotenv
+        load_dotenv()
 
-    initial = AgentState(task=task, keep_open=keep_open)
-    final = await graph.ainvoke(initial, config={"recursion_limit": 100})
+    from agents.message_protocol import AgentState
+    from automation.browser_pool import BrowserPool
 
-    print("=== Task Completed ===")
+    # Python 3.12+: tasks that finish without suspending never hit the scheduler
+    if hasattr(asyncio, "eager_task_factory"):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
 
-    # Support both Pydantic models (have .json()) and plain dicts
-    if hasattr(final, "json") and callable(getattr(final, "json")):
-        out = final.json(indent=2)
-    else:
+    # Launch the browser while the planner produces the first plan
+    warmup = asyncio.create_task(BrowserPool.warmup(1, headless=False))
+
+    initial = AgentState(task=task, keep_open=keep_open)
+    executor = _acquire_executor()
+    try:
         try:
-            out = json.dumps(final, indent=2)
-        except TypeError:
-            # some inner types may not be JSON-serializable; pretty-print fallback
-            import pprint
-            out = pprint.pformat(final, indent=2)
+            if use_graph:
+                from graph.langgraph_builder import build_graph
+                graph = build_graph(planner_node, executor_node)
+                final = await graph.ainvoke(
+                    initial,
+                    config={"recursion_limit": 100, "configurable": {"executor": executor}},
+                )
+            else:
+                final = await _run_loop(initial, {"configurable": {"executor": executor}})
+        finally:
+            # The run is over even if the browser stays open; persist buffered steps
+            await executor.finish_run()
+
+        _print_final(final, verbose)
 
-    print(out)
+        if keep_open:
+            print("\n[INFO] Browser is kept open. Press Enter to close and exit...")
+            await asyncio.to_thread(input)
+    finally:
+        # The agent and its browser stay warm in the pool for the next run;
+        # shutdown() tears them down
+        _release_executor(executor)
+        await warmup
 
-    if keep_open:
-        print("\n[INFO] Browser is kept open. Press Enter to close and exit...")
-        await asyncio.get_event_loop().run_in_executor(None, input)
-        # Cleanup
-        if _executor_agent:
-            await _executor_agent.stop()
+
+async def shutdown():
+    """Stop pooled executors, then close the browsers and the Playwright driver; call once at process exit."""
+    from automation.browser_pool import BrowserPool
+    await _close_executors()
+    await BrowserPool.close_all()
+
+
+async def _cli(args):
+    try:
+        await run(args.task, args.keep_open, args.verbose, args.graph)
+    finally:
+        await shutdown()
 
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument("--task", "-t", required=True)
     parser.add_argument("--keep-open", action="store_true", default=True, help="Keep browser open after task completion (default: True)")
+    parser.add_argument("--verbose", "-v", action="store_true", help="Print the full final state instead of a summary")
+    parser.add_argument("--graph", action="store_true", help="Run through the LangGraph graph instead of the plain loop (for debugging)")
     args = parser.parse_args()
 
     # Run the async pipeline and propagate exceptions to show tracebacks
     try:
         if sys.platform.startswith("win"):
             asyncio.set_event_loop_policy(asyncio.WindowsProactorEventLoopPolicy())
-        asyncio.run(run(args.task, args.keep_open))
+        else:
+            # libuv-backed loop when available; stock asyncio otherwise
+            try:
+                import uvloop
+                asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+            except ImportError:
+                pass
+        asyncio.run(_cli(args))
     except RuntimeError as e:
         if str(e) == "Event loop is closed":
             # Known issue on Windows with ProactorEventLoop and subprocesses
@@ -1,46 +1,92 @@
+import asyncio
 import os
-import json
+import re
 from datetime import datetime
+
+import orjson
 from agents.message_protocol import StepExecutionResult
 
+# \W is exactly "not str.isalnum() and not '_'", and '_' maps to itself
+_SLUG_RE = re.compile(r"\W")
+
 def _slug(text: str):
-    return "".join(c if c.isalnum() else "_" for c in text).lower()
+    return _SLUG_RE.sub("_", text).lower()
 
 class DatasetWriter:
-    def __init__(self, base_dir: str = "dataset"):
+    def __init__(self, base_dir: str = "dataset", flush_every: int = 10):
         self.base_dir = base_dir
+        self.flush_every = flush_every
+        self._pending = {}      # run_dir -> step records not yet on disk
+        self._tasks = {}        # run_dir -> task, for the manifest
+        self._step_counts = {}  # run_dir -> records already in steps.jsonl
+        self._next_id = None    # next run id, found by the first create_run_dir
         os.makedirs(self.base_dir, exist_ok=True)
 
     def create_run_dir(self, task: str):
-        existing = [d for d in os.listdir(self.base_dir) if d.isdigit() and os.path.isdir(os.path.join(self.base_dir, d))]
-        if existing:
-            next_id = max(int(d) for d in existing) + 1
-        else:
-            next_id = 1
-        
-        path = os.path.join(self.base_dir, f"{next_id:04d}")
-        os.makedirs(path, exist_ok=True)
-        return path
+        # Scan once per writer; scandir's is_dir() uses d_type instead of a stat
+        if self._next_id is None:
+            with os.scandir(self.base_dir) as entries:
+                self._next_id = max(
+                    (int(e.name) for e in entries if e.name.isdigit() and e.is_dir(follow_symlinks=False)),
+                    default=0,
+                ) + 1
+        # The cached id can be stale when another writer shares base_dir;
+        # makedirs claims the directory atomically, so skip ids already taken
+        while True:
+            path = os.path.join(self.base_dir, f"{self._next_id:04d}")
+            self._next_id += 1
+            try:
+                os.makedirs(path)
+                return path
+            except FileExistsError:
+                continue
+
+    async def buffer_step(self, task: str, step: StepExecutionResult, run_dir: str):
+        """
+        Queue a step record in memory. Records are written every flush_every
+        steps, or when flush() is called at the end of the run.
+        """
+        pending = self._pending.get(run_dir)
+        # Checked before appending: the caller may still update the newest record
+        if pending and len(pending) >= self.flush_every:
+            await self.flush(run_dir)
 
-    def write_step(self, task: str, step: StepExecutionResult, run_dir: str):
-        steps_file = os.path.join(run_dir, "steps.json")
+        self._tasks[run_dir] = task
+        self._pending.setdefault(run_dir, []).append(step)
 
-        if os.path.exists(steps_file):
-            steps = json.load(open(steps_file))
-        else:
-            steps = []
+    async def flush(self, run_dir: str = None):
+        """Write out buffered steps for run_dir, or for every run if omitted."""
+        for pending_dir in ([run_dir] if run_dir else list(self._pending)):
+            # Take the batch on the loop thread; only the file IO runs in a worker
+            pending = self._pending.pop(pending_dir, None)
+            if pending:
+                await asyncio.to_thread(self._write_records, pending_dir, pending)
 
-        steps.append(step.dict())
+    def _write_records(self, run_dir: str, pending: list):
+        # JSON Lines: each flush appends, nothing already written is re-read
+        steps_file = os.path.join(run_dir, "steps.jsonl")
 
-        json.dump(steps, open(steps_file, "w"), indent=2)
+        if run_dir not in self._step_counts:
+            count = 0
+            if os.path.exists(steps_file):
+                with open(steps_file) as f:
+                    count = sum(1 for _ in f)
+            self._step_counts[run_dir] = count
+
+        # orjson serializes the step dataclasses directly, no asdict() copy
+        with open(steps_file, "ab") as f:
+            f.write(b"".join(orjson.dumps(step) + b"\n" for step in pending))
+
+        self._step_counts[run_dir] += len(pending)
 
         manifest = {
-            "task": task,
-            "updated_at": datetime.utcnow().isoformat(),
-            "num_steps": len(steps)
+            "task": self._tasks[run_dir],
+            "updated_at": datetime.utcnow(),
+            "num_steps": self._step_counts[run_dir]
         }
-        json.dump(
-            manifest,
-            open(os.path.join(run_dir, "manifest.json"), "w"),
-            indent=2
-        )
\ No newline at end of file
+        with open(os.path.join(run_dir, "manifest.json"), "wb") as f:
+            f.write(orjson.dumps(manifest, option=orjson.OPT_INDENT_2))
+
+    async def write_step(self, task: str, step: StepExecutionResult, run_dir: str):
+        await self.buffer_step(task, step, run_dir)
+        await self.flush(run_dir)
@@ -1,22 +1,54 @@
+import atexit
 import logging
+import logging.handlers
+import os
 import sys
 
+# Configured loggers by name; repeat calls return without touching handlers
+_loggers = {}
+# One buffered file handler shared by every logger, so an ERROR flush writes
+# all modules' pending records in the order they were logged
+_file_handler = None
+
+
+def _get_file_handler(log_file: str, log_format: logging.Formatter):
+    global _file_handler
+    if _file_handler is None:
+        f_handler = logging.FileHandler(log_file)
+        f_handler.setFormatter(log_format)
+
+        # Buffer file writes: one write per 256 records, or immediately on ERROR
+        _file_handler = logging.handlers.MemoryHandler(
+            capacity=256, flushLevel=logging.ERROR, target=f_handler
+        )
+        atexit.register(_file_handler.flush)
+    return _file_handler
+
 def get_logger(name: str):
+    if name in _loggers:
+        return _loggers[name]
+
     logger = logging.getLogger(name)
     if not logger.handlers:
         logger.setLevel(logging.INFO)
 
         # Create handlers
         c_handler = logging.StreamHandler(sys.stdout)
-        f_handler = logging.FileHandler('agent.log')
 
         # Create formatters and add it to handlers
         log_format = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         c_handler.setFormatter(log_format)
-        f_handler.setFormatter(log_format)
 
         # Add handlers to the logger
         logger.addHandler(c_handler)
-        logger.addHandler(f_handler)
-    
+
+        # File logging only when asked for, e.g. AGENT_LOG_FILE=agent.log
+        log_file = os.environ.get("AGENT_LOG_FILE")
+        if log_file:
+            logger.addHandler(_get_file_handler(log_file, log_format))
+
+        # Our handlers already emit the record; don't format it again at root
+        logger.propagate = False
+
+    _loggers[name] = logger
     return logger